@@ -1,256 +1,3256 @@
 import random
 import logging
+import logging.handlers
+import contextvars
+import gzip
+import queue
+import shutil
+import atexit
+import copy
 import subprocess
 import sys
 import os
 import re
 import time
 import concurrent.futures
+import functools
+import threading
+import weakref
 import discord
 from discord.ext import commands, tasks
 import docker
 import asyncio
+import aiohttp.web
 from discord import app_commands
 from discord.ui import View, Button, Select
 import psutil
 import datetime
 import json
-from typing import Dict, List, Optional
+import sqlite3
+import socket
+import ssl
+import bisect
+import signal
+import uuid
+from collections import deque
+from typing import Dict, List, Literal, Optional
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
 
 # Configuration
+# These are the defaults; CONFIG_FILE overrides them and is re-read on SIGHUP or when it changes
+CONFIG_FILE = os.environ.get('NXH_CONFIG', 'config.toml')
+CONFIG_POLL_INTERVAL = 5  # Seconds between checks for a changed CONFIG_FILE
 TOKEN = 'your discord bot token'
 SERVER_LIMIT = 1  # Increased limit per user
-DATABASE_FILE = 'database.json'  # Changed to JSON for better structure
-LOG_FILE = 'bot.log'
-ADMIN_IDS = [yourid]  # Add your admin user IDs here
-ALLOWED_CHANNEL_ID = 92962972  # Only this channel can use commands
+DATABASE_FILE = 'database.db'  # SQLite store (WAL mode)
+LEGACY_DATABASE_FILE = 'database.json'  # Imported once into DATABASE_FILE
+LOG_FILE = 'bot.log'  # One JSON object per line; rotated by size and daily, old files gzipped
+LOG_MAX_BYTES = 20 * 1024 ** 2  # Rotate once the file reaches this size...
+LOG_BACKUP_COUNT = 10  # ...or at midnight, keeping this many compressed files
+LOG_QUEUE_SIZE = 10000  # Records waiting for the writer thread; more are dropped and counted
+LOG_SAMPLE_WINDOW = 60  # Warnings and errors from one line of code are sampled per window (seconds)...
+LOG_SAMPLE_BURST = 5  # ...letting this many through, then only counting the rest
+ADMIN_IDS = {yourid}  # Add your admin user IDs here
+ALLOWED_CHANNEL_IDS = {92962972}  # Only these channels can use commands
+ALLOWED_GUILD_IDS = set()  # Only these servers can use commands (empty = any)
+
+# Docker daemons instances are placed on. No base_url means the local daemon from the
+# environment; remote ones look like "tcp://10.0.0.2:2376" (add tls_* paths) or
+# "unix:///run/docker-b.sock". Existing instances keep the host they were created on.
+DOCKER_HOSTS = {
+    "local": {},
+}
+PLACEMENT_STRATEGY = "best-fit"  # "best-fit" packs hosts tightly, "least-loaded" spreads instances out
+DOCKER_HOST_REFRESH_INTERVAL = 30  # Seconds between host capacity checks
+
+# Docker SDK calls run on this many worker threads per host, never on the event loop
+DOCKER_POOL_SIZE = 16
+# Per-operation Docker timeouts in seconds
+DOCKER_TIMEOUTS = {
+    "default": 30,
+    "pull": 900,
+    "run": 120,
+    "stop": 60,
+    "remove": 60,
+    "restart": 90,
+    "stats": 15,
+    "exec": 15,
+    "list": 30,
+    "prune": 600,
+}
+
+# Image pre-pull: every DOCKER_IMAGES entry is pulled onto every host at startup and
+# again every IMAGE_PULL_INTERVAL, so deploys rarely wait for a download
+IMAGE_PULL_INTERVAL = 6 * 3600
+IMAGE_PULL_CONCURRENCY = 2  # Pulls running at once across all hosts
+REGISTRY_MIRROR = None  # Registry like "registry.internal:5000" to try first; images are pushed there under their usual names
+
+# Resource profiles instances run with. Every DOCKER_IMAGES entry lists the profiles
+# it offers: the first is its default, any others are tiers the user can pick.
+RESOURCE_PROFILES = {
+    "standard": {
+        "display_name": "Standard 💖",
+        "cpus": 2,  # Hard CPU cap (nano_cpus)
+        "memory": 6 * 1024 ** 3,  # Bytes
+        "memory_swap": 6 * 1024 ** 3,  # Memory + swap in bytes; same as memory = no swap
+        "pids": 1024,  # Max processes, stops fork bombs
+        "nofile": 65536,  # Max open files per process
+        "cpu_shares": 512,  # CPU priority relative to other containers
+        "blkio_weight": 500,  # Disk I/O priority, 10-1000
+        "disk": None,  # Root filesystem size like "20G"; needs overlay2 on xfs with pquota
+    },
+}
+
+# Progress embeds are edited at most this often (seconds); newer states replace older ones
+PROGRESS_FLUSH_INTERVAL = 1.0
+
+# Deployment queue
+DEPLOY_MAX_CONCURRENT = 3  # Deployments running at once across all images
+DEPLOY_MAX_PER_IMAGE = 2  # Deployments of the same image running at once
+DEPLOY_MEMORY_HEADROOM = 1024 ** 3  # Bytes of host memory to keep free beyond the new instance
+DEPLOY_ADMISSION_TIMEOUT = 300  # Seconds a job may wait for memory before it's rejected
+
+# Prometheus metrics, served as text on http://METRICS_ADDRESS:METRICS_PORT/metrics
+METRICS_ADDRESS = "127.0.0.1"  # Keep it local; put a scraper or proxy next to the bot
+METRICS_PORT = 9464  # 0 = no endpoint
+LOOP_LAG_PROBE_INTERVAL = 0.5  # Seconds between event-loop lag probes
+
+# Loop profiler: a watchdog thread samples the loop thread's stack whenever the loop stalls
+PROFILER_ENABLED = False  # Run it from startup; /admin-profile can also start and stop it
+PROFILER_STALL_THRESHOLD = 0.1  # Seconds the loop may be blocked before it counts as a stall
+PROFILER_SAMPLE_INTERVAL = 0.02  # Seconds between watchdog checks (and stack samples during a stall)
+PROFILER_HISTORY = 50  # Recent stalls kept for /admin-profile
+
+# Background stats sweeps (handlers only ever read the cached samples)
+STATS_INTERVAL = 15  # Seconds between sweeps
+STATS_HISTORY = 40  # Samples kept per container
+STATS_CONCURRENCY = 8  # Containers sampled in parallel, keeps DOCKER_POOL_SIZE free for users
+
+# Idle hibernation: running instances with no tmate client and next to no CPU or
+# network use are stopped, and /start wakes them up again
+IDLE_TIMEOUT = 4 * 3600  # Seconds without activity before an instance is stopped (0 = never)
+IDLE_CPU_PERCENT = 2.0  # CPU use below this (percent of one core) counts as idle
+IDLE_NET_BYTES = 256 * 1024  # Network traffic between two stats samples below this counts as idle
+IDLE_CHECK_INTERVAL = 300  # Seconds between idle checks
+
+# Full database/Docker diff; the events stream keeps things in sync in between
+RECONCILE_INTERVAL = 300
+
+# Ownership labels: every container carries its owner, image and this bot's ID,
+# so the store can be checked against (or rebuilt from) Docker alone
+BOT_INSTANCE_ID = None  # Tells bots sharing a Docker host apart; None = generated once and kept in the database
+INDEX_STARTUP_MODE = "verify"  # "off", "verify" (log differences) or "rebuild" (also fix the store) when the bot starts
+
+# Garbage collection
+INSTANCE_TTL = 0  # Seconds an instance lives before it's removed (0 = forever); set when it's created
+GC_INTERVAL = 3600  # Seconds between GC passes
+GC_ORPHAN_GRACE = 600  # Seconds an unknown bot-made container may exist before it counts as leaked
+GC_PRUNE_HOURS = (3, 6)  # Local hours [start, end) in which dangling images and volumes are pruned
+
+# tmate session capture
+TMATE_CAPTURE_TIMEOUT = 30  # Seconds tmate gets to print its SSH line before it's killed
+TMATE_URL_GRACE = 2  # Extra seconds to collect the web/read-only URLs after the SSH line
+TMATE_MAX_BANNER_LINES = 200  # Lines read while looking for the SSH line
+TMATE_MAX_LINE_BYTES = 64 * 1024  # Longer output lines are skipped, never buffered
+
+# Pre-started instances (with a tmate session) kept ready per DOCKER_IMAGES key
+WARM_POOL_SIZES = {
+    "ubuntu-22.04": 1,
+}
+WARM_POOL_REFILL_INTERVAL = 30  # Seconds between background refill checks
+WARM_POOL_MAX_CPU_PERCENT = 75  # Don't pre-start instances while the host is busier than this
+WARM_POOL_MIN_FREE_MEMORY = 2 * 1024 ** 3  # Bytes of host memory to keep free after a refill
+
+# Available Docker images with metadata
+DOCKER_IMAGES = {
+    "ubuntu-22.04": {
+        "name": "ubuntu-22.04-with-tmate",
+        "display_name": "Ubuntu 22.04 🌸",
+        "description": "Adorable Ubuntu 22.04 with tmate pre-installed ✨",
+        "profiles": ["standard"]
+    },
+}
+
+# Cute pastel color palette
+COLORS = {
+    'pink': 0xFFB3E6,      # Soft pink
+    'purple': 0xC8A8E9,    # Lavender
+    'blue': 0xB3D9FF,      # Baby blue
+    'green': 0xB3FFB3,     # Mint green
+    'yellow': 0xFFE0B3,    # Peach
+    'red': 0xFFB3B3,       # Rose pink
+    'success': 0xC8E6C9,   # Light green
+    'error': 0xFFCDD2,     # Light red
+    'info': 0xE1F5FE,      # Light blue
+}
+
+# Setup logging
+# Handlers only enqueue records; a listener thread formats and writes them, so
+# neither disk nor the console ever blocks the event loop
+log_context: contextvars.ContextVar[Dict] = contextvars.ContextVar('log_context', default={})
+
+def bind_log_context(**fields):
+    """Starts a fresh logging context (interaction, user, container, phase, ...) for this task."""
+    log_context.set({key: value for key, value in fields.items() if value is not None})
+
+def update_log_context(**fields):
+    log_context.set({**log_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+
+class ContextFilter(logging.Filter):
+    # Runs on the thread that logged, before the record is queued, where the context is still visible
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = log_context.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Lets LOG_SAMPLE_BURST warnings or errors per call site through per window and counts the rest.
+
+    The next record let through from that call site carries the count as
+    ``suppressed``. Call sites are keyed by file and line since messages are
+    f-strings that differ per container.
+    """
+
+    def __init__(self, window: float, burst: int):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._sites: Dict[tuple, List] = {}  # (path, line) -> [window start, let through, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno), [now, 0, 0])
+            if now - site[0] >= self.window:
+                site[0], site[1] = now, 0
+            if site[1] >= self.burst:
+                site[2] += 1
+                return False
+            site[1] += 1
+            if site[2]:
+                record.suppressed, site[2] = site[2], 0
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops records instead of blocking or growing when the writer falls behind."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        # The first record that fits again reports how many were lost
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+class LogListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Waits for the writer to free a slot rather than failing when the queue is full at exit
+        self.queue.put(self._sentinel)
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        # Tracebacks are already part of the message: QueueHandler.prepare() folds them in
+        for extra in ("suppressed", "dropped"):
+            if hasattr(record, extra):
+                entry[extra] = getattr(record, extra)
+        return json.dumps(entry, default=str)
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates at LOG_MAX_BYTES or at local midnight, whichever comes first, gzipping old files."""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+        self.rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight() -> float:
+        tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+        return tomorrow.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    @staticmethod
+    def _compress(source: str, destination: str):
+        with open(source, "rb") as plain, gzip.open(destination, "wb") as compressed:
+            shutil.copyfileobj(plain, compressed)
+        os.remove(source)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_midnight()
+
+log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+log_queue_handler = DroppingQueueHandler(log_queue)
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Only folds tracebacks into the message
+log_queue_handler.addFilter(ContextFilter())
+log_queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_WINDOW, LOG_SAMPLE_BURST))
+log_file_handler = CompressingRotatingFileHandler(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+log_file_handler.setFormatter(JsonFormatter())
+log_console_handler = logging.StreamHandler()
+log_console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
+log_listener = LogListener(log_queue, log_file_handler, log_console_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger = logging.getLogger(__name__)
+
+# Config file
+class ConfigError(Exception):
+    pass
+
+def _int_at_least(minimum: int):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+            raise ConfigError(f"expected a whole number >= {minimum}, got {value!r}")
+        return value
+    return check
+
+def _number_at_least(minimum: float):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum:
+            raise ConfigError(f"expected a number >= {minimum}, got {value!r}")
+        return value
+    return check
+
+def _hour_range(value) -> tuple:
+    if not isinstance(value, list) or len(value) != 2:
+        raise ConfigError(f"expected [start_hour, end_hour], got {value!r}")
+    start, end = (_int_at_least(0)(hour) for hour in value)
+    if start > 23 or end > 24:
+        raise ConfigError(f"hours must be between 0 and 24, got {value!r}")
+    return (start, end)
+
+def _string(value) -> str:
+    if not isinstance(value, str) or not value:
+        raise ConfigError(f"expected a non-empty string, got {value!r}")
+    return value
+
+def _bool(value) -> bool:
+    if not isinstance(value, bool):
+        raise ConfigError(f"expected true or false, got {value!r}")
+    return value
+
+def _byte_size(value) -> int:
+    # Either a number of bytes or a Docker-style size like "6g"
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ConfigError(f"expected a size like \"6g\", got {value!r}")
+    try:
+        return docker.utils.parse_bytes(value)
+    except docker.errors.DockerException as e:
+        raise ConfigError(str(e))
+
+def _id_set(value) -> set:
+    if not isinstance(value, list):
+        raise ConfigError(f"expected a list of IDs, got {value!r}")
+    return {_int_at_least(1)(item) for item in value}
+
+def _timeouts(value) -> Dict[str, float]:
+    if not isinstance(value, dict):
+        raise ConfigError(f"expected a table of operation = seconds, got {value!r}")
+    timeouts = dict(CONFIG_DEFAULTS['DOCKER_TIMEOUTS'])
+    for operation, seconds in value.items():
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds <= 0:
+            raise ConfigError(f"timeout for '{operation}' must be a positive number of seconds")
+        timeouts[operation] = seconds
+    return timeouts
+
+def _pool_sizes(value) -> Dict[str, int]:
+    if not isinstance(value, dict):
+        raise ConfigError(f"expected a table of image = count, got {value!r}")
+    return {image_name: _int_at_least(0)(count) for image_name, count in value.items()}
+
+def _images(value) -> Dict[str, Dict]:
+    if not isinstance(value, dict) or not value:
+        raise ConfigError("expected at least one [images.\"<key>\"] table")
+    images = {}
+    for image_name, image_data in value.items():
+        if not isinstance(image_data, dict):
+            raise ConfigError(f"image '{image_name}' must be a table")
+        missing = {"name", "display_name", "description", "profiles"} - image_data.keys()
+        if missing:
+            raise ConfigError(f"image '{image_name}' is missing {', '.join(sorted(missing))}")
+        profiles = image_data["profiles"]
+        if not isinstance(profiles, list) or not profiles:
+            raise ConfigError(f"image '{image_name}' needs a non-empty list of profiles")
+        images[image_name] = {key: _string(field) for key, field in image_data.items() if key != "profiles"}
+        images[image_name]["profiles"] = [_string(profile_name) for profile_name in profiles]
+    return images
+
+# Settings a [profiles.<name>] table may have; fixed, since the live profiles can be renamed
+PROFILE_KEYS = ("display_name", "cpus", "memory", "memory_swap", "pids", "nofile", "cpu_shares", "blkio_weight", "disk")
+
+def _profiles(value) -> Dict[str, Dict]:
+    if not isinstance(value, dict) or not value:
+        raise ConfigError("expected at least one [profiles.<name>] table")
+    profiles = {}
+    for profile_name, fields in value.items():
+        if not isinstance(fields, dict):
+            raise ConfigError(f"profile '{profile_name}' must be a table")
+        unknown = set(fields) - set(PROFILE_KEYS)
+        if unknown:
+            raise ConfigError(f"profile '{profile_name}' has unknown settings: {', '.join(sorted(unknown))}")
+        try:
+            cpus = fields["cpus"]
+            if isinstance(cpus, bool) or not isinstance(cpus, (int, float)) or cpus <= 0:
+                raise ConfigError(f"cpus must be a positive number, got {cpus!r}")
+            memory = _byte_size(fields["memory"])
+            profile = {
+                "display_name": _string(fields.get("display_name", profile_name)),
+                "cpus": cpus,
+                "memory": memory,
+                "memory_swap": _byte_size(fields.get("memory_swap", memory)),
+                "pids": _int_at_least(16)(fields.get("pids", 1024)),
+                "nofile": _int_at_least(1024)(fields.get("nofile", 65536)),
+                "cpu_shares": _int_at_least(2)(fields.get("cpu_shares", 512)),
+                "blkio_weight": _int_at_least(10)(fields.get("blkio_weight", 500)),
+                "disk": _string(fields["disk"]) if "disk" in fields else None,
+            }
+        except KeyError as e:
+            raise ConfigError(f"profile '{profile_name}' is missing {e.args[0]}")
+        except ConfigError as e:
+            raise ConfigError(f"profile '{profile_name}': {e}")
+        if profile["blkio_weight"] > 1000:
+            raise ConfigError(f"profile '{profile_name}': blkio_weight must be at most 1000")
+        if profile["memory_swap"] < memory:
+            raise ConfigError(f"profile '{profile_name}': memory_swap can't be less than memory")
+        profiles[profile_name] = profile
+    return profiles
+
+def _hosts(value) -> Dict[str, Dict]:
+    if not isinstance(value, dict) or not value:
+        raise ConfigError("expected at least one [docker.hosts.<name>] table")
+    hosts = {}
+    for host_name, fields in value.items():
+        if not isinstance(fields, dict):
+            raise ConfigError(f"host '{host_name}' must be a table")
+        unknown = set(fields) - {"base_url", "tls_ca", "tls_cert", "tls_key"}
+        if unknown:
+            raise ConfigError(f"host '{host_name}' has unknown settings: {', '.join(sorted(unknown))}")
+        if ("tls_cert" in fields) != ("tls_key" in fields):
+            raise ConfigError(f"host '{host_name}' needs both tls_cert and tls_key")
+        hosts[host_name] = {key: _string(field) for key, field in fields.items()}
+    return hosts
+
+def _one_of(*choices):
+    def validate(value) -> str:
+        if value not in choices:
+            raise ConfigError(f"expected one of {', '.join(map(repr, choices))}, got {value!r}")
+        return value
+    return validate
+
+def check_profiles_fit_host(profiles: Dict[str, Dict], host_cpus: int, host_memory: int):
+    """Rejects profiles a single instance could never get on a host this size."""
+    for profile_name, profile in profiles.items():
+        if profile["cpus"] > host_cpus:
+            raise ConfigError(f"profile '{profile_name}' wants {profile['cpus']} CPUs but the host has {host_cpus}")
+        if profile["memory"] > host_memory:
+            raise ConfigError(
+                f"profile '{profile_name}' wants {profile['memory'] / 1024 ** 3:.1f}GB of memory "
+                f"but the host has {host_memory / 1024 ** 3:.1f}GB"
+            )
+
+# TOML key -> (module constant, validator). Anything not in the file keeps its default above.
+CONFIG_KEYS = {
+    "token": ("TOKEN", _string),
+    "server_limit": ("SERVER_LIMIT", _int_at_least(1)),
+    "admin_ids": ("ADMIN_IDS", _id_set),
+    "allowed_channel_ids": ("ALLOWED_CHANNEL_IDS", _id_set),
+    "allowed_guild_ids": ("ALLOWED_GUILD_IDS", _id_set),
+    "docker.timeouts": ("DOCKER_TIMEOUTS", _timeouts),
+    "docker.hosts": ("DOCKER_HOSTS", _hosts),
+    "docker.pull_concurrency": ("IMAGE_PULL_CONCURRENCY", _int_at_least(1)),
+    "docker.registry_mirror": ("REGISTRY_MIRROR", _string),
+    "docker.placement": ("PLACEMENT_STRATEGY", _one_of("best-fit", "least-loaded")),
+    "profiles": ("RESOURCE_PROFILES", _profiles),
+    "deploy.max_concurrent": ("DEPLOY_MAX_CONCURRENT", _int_at_least(1)),
+    "deploy.max_per_image": ("DEPLOY_MAX_PER_IMAGE", _int_at_least(1)),
+    "deploy.memory_headroom": ("DEPLOY_MEMORY_HEADROOM", _byte_size),
+    "deploy.admission_timeout": ("DEPLOY_ADMISSION_TIMEOUT", _int_at_least(0)),
+    "warm_pool.sizes": ("WARM_POOL_SIZES", _pool_sizes),
+    "warm_pool.max_cpu_percent": ("WARM_POOL_MAX_CPU_PERCENT", _int_at_least(1)),
+    "warm_pool.min_free_memory": ("WARM_POOL_MIN_FREE_MEMORY", _byte_size),
+    "gc.instance_ttl": ("INSTANCE_TTL", _int_at_least(0)),
+    "gc.orphan_grace": ("GC_ORPHAN_GRACE", _int_at_least(0)),
+    "gc.prune_hours": ("GC_PRUNE_HOURS", _hour_range),
+    "idle.timeout": ("IDLE_TIMEOUT", _int_at_least(0)),
+    "idle.cpu_percent": ("IDLE_CPU_PERCENT", _number_at_least(0)),
+    "idle.net_bytes": ("IDLE_NET_BYTES", _byte_size),
+    "index.bot_instance_id": ("BOT_INSTANCE_ID", _string),
+    "index.startup_mode": ("INDEX_STARTUP_MODE", _one_of("off", "verify", "rebuild")),
+    "profiler.enabled": ("PROFILER_ENABLED", _bool),
+    "profiler.stall_threshold": ("PROFILER_STALL_THRESHOLD", _number_at_least(0.01)),
+    "metrics.address": ("METRICS_ADDRESS", _string),
+    "metrics.port": ("METRICS_PORT", _int_at_least(0)),
+    "images": ("DOCKER_IMAGES", _images),
+}
+CONFIG_DEFAULTS = {name: globals()[name] for name, _ in CONFIG_KEYS.values()}
+
+def _flatten_config(table: Dict, prefix: str = ""):
+    for key, value in table.items():
+        path = f"{prefix}{key}"
+        if path in CONFIG_KEYS or not isinstance(value, dict):
+            yield path, value
+        else:
+            yield from _flatten_config(value, f"{path}.")
+
+def load_config(path: str) -> Dict[str, object]:
+    """Reads and validates the config file, returning a complete set of constants.
+
+    Raises ConfigError without side effects, so a bad edit never replaces a good
+    config. A missing file just means the defaults.
+    """
+    values = dict(CONFIG_DEFAULTS)
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                table = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise ConfigError(f"{path}: {e}")
+        
+        for key, value in _flatten_config(table):
+            if key not in CONFIG_KEYS:
+                raise ConfigError(f"{path}: unknown setting '{key}'")
+            name, check = CONFIG_KEYS[key]
+            try:
+                values[name] = check(value)
+            except ConfigError as e:
+                raise ConfigError(f"{path}: {key}: {e}")
+    
+    # Keeps the token out of the file if you'd rather
+    if os.environ.get('NXH_TOKEN'):
+        values['TOKEN'] = os.environ['NXH_TOKEN']
+    
+    unknown = set(values['WARM_POOL_SIZES']) - set(values['DOCKER_IMAGES'])
+    if unknown:
+        raise ConfigError(f"{path}: warm_pool.sizes names unknown images: {', '.join(sorted(unknown))}")
+    for image_name, image_data in values['DOCKER_IMAGES'].items():
+        unknown = set(image_data['profiles']) - set(values['RESOURCE_PROFILES'])
+        if unknown:
+            raise ConfigError(f"{path}: image '{image_name}' uses unknown profiles: {', '.join(sorted(unknown))}")
+    # Remote hosts are only known once connected; DockerHostRegistry checks those
+    if all(not host.get('base_url', 'unix://').startswith(('tcp://', 'ssh://', 'http')) for host in values['DOCKER_HOSTS'].values()):
+        try:
+            check_profiles_fit_host(values['RESOURCE_PROFILES'], os.cpu_count() or 1, psutil.virtual_memory().total)
+        except ConfigError as e:
+            raise ConfigError(f"{path}: {e}")
+    return values
+
+def config_fingerprint(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Applied with a single globals() update: there's no await in between, so no
+# handler ever sees half of an old config and half of a new one
+try:
+    globals().update(load_config(CONFIG_FILE))
+except ConfigError as e:
+    raise SystemExit(f"Invalid config: {e}")
+config_loaded_fingerprint = config_fingerprint(CONFIG_FILE)
+
+intents = discord.Intents.default()
+intents.messages = True
+intents.message_content = True
+
+class GuardedCommandTree(app_commands.CommandTree):
+    """Runs the channel, admin and instance ownership checks once for every command.
+
+    Commands declare what they need through ``extras``: ``admin_only`` limits them
+    to ADMIN_IDS and ``view_only`` relaxes the ownership error for read-only
+    commands. A ``container_id`` option is expanded and authorized here, and the
+    full ID is handed to the command in ``interaction.extras['container_id']``.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        is_command = interaction.type is discord.InteractionType.application_command
+        bind_log_context(interaction=interaction.id, user=str(interaction.user.id))
+        if interaction.command is not None:
+            label_task(f"/{interaction.command.qualified_name}" + ("" if is_command else " (autocomplete)"))
+            update_log_context(command=interaction.command.qualified_name)
+        if not in_allowed_place(interaction):
+            if is_command:
+                await interaction.response.send_message(embed=EMBEDS['wrong_channel'], ephemeral=True)
+            return False
+
+        # Autocomplete only filters the caller's own choices, it never needs more
+        command = interaction.command
+        if not is_command or command is None:
+            return True
+
+        if command.extras.get('admin_only') and not is_admin(interaction.user.id):
+            await interaction.response.send_message(embed=EMBEDS['admin_only'], ephemeral=True)
+            return False
+
+        container_id = getattr(interaction.namespace, 'container_id', None)
+        if container_id is not None:
+            container_id = await authorize_instance(
+                interaction,
+                container_id,
+                view_only=command.extras.get('view_only', False)
+            )
+            if not container_id:
+                return False
+            interaction.extras['container_id'] = container_id
+            update_log_context(container=container_id[:12])
+        return True
+
+bot = commands.Bot(command_prefix='/', intents=intents, tree_cls=GuardedCommandTree)
+
+# Metrics
+# Recording is an in-memory update on the loop thread; the text format is only
+# rendered when something scrapes the endpoint
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names: tuple, values: tuple, **extra) -> str:
+    pairs = [(name, value) for name, value in zip(names, values)] + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(labels[name] for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in self._values.items()]
+
+class Gauge(Metric):
+    """A value read when scraped: ``collect()`` returns {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.error(f"Could not collect metric {self.name}: {e}")
+            return []
+        return [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        self._series: Dict[tuple, List] = {}  # Label values -> [per-bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le=f'{bound:g}')} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le='+Inf')} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+metrics = MetricsRegistry()
+DEPLOY_PHASE_SECONDS = metrics.register(Histogram(
+    "nxh_deploy_phase_seconds", "Time spent in each deployment phase", ("phase",)
+))
+DEPLOY_SECONDS = metrics.register(Histogram(
+    "nxh_deploy_seconds", "Time from admission to a ready instance", ("source",)
+))
+DOCKER_CALL_SECONDS = metrics.register(Histogram(
+    "nxh_docker_call_seconds", "Docker SDK call latency", ("operation",)
+))
+DOCKER_CALL_ERRORS = metrics.register(Counter(
+    "nxh_docker_call_errors_total", "Docker SDK calls that failed or timed out", ("operation", "reason")
+))
+LOOP_LAG_SECONDS = metrics.register(Histogram(
+    "nxh_event_loop_lag_seconds", "Delay before a ready task gets to run on the event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+))
+CACHE_REQUESTS = metrics.register(Counter(
+    "nxh_cache_requests_total", "Lookups in the bot's caches and pools", ("cache", "result")
+))
+
+LOOP_STALL_SECONDS = metrics.register(Histogram(
+    "nxh_event_loop_stall_seconds", "Event loop stalls caught by the profiler", ("command",)
+))
+
+async def metrics_handler(request):
+    return aiohttp.web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+async def start_metrics_server():
+    app = aiohttp.web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = aiohttp.web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await aiohttp.web.TCPSite(runner, METRICS_ADDRESS, METRICS_PORT).start()
+    logger.info(f"Serving metrics on http://{METRICS_ADDRESS}:{METRICS_PORT}/metrics")
+    return runner
+
+# Loop profiler
+# Tasks running a command or deployment, so a stall can be charged to it
+task_labels: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+def label_task(label: str):
+    task = asyncio.current_task()
+    if task is not None:
+        task_labels[task] = label
+
+class LoopProfiler:
+    """Finds out what blocks the event loop.
+
+    The loop bumps a heartbeat every ``interval``; a watchdog thread that sees
+    it go stale samples the loop thread's stack until it beats again. Each
+    stall is charged to the command or task that was running, the bot
+    function it was in and the innermost call it was stuck in (usually
+    Docker, SQLite or a file).
+    """
+
+    SOURCE_FILE = sys._getframe().f_code.co_filename
+
+    def __init__(self, threshold: float, interval: float, history: int):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: deque = deque(maxlen=history)
+        self.totals: Dict[tuple, List] = {}  # (command, site, call) -> [stalls, seconds, worst]
+        self.max_lag = 0.0
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._beat = 0.0
+        self._handle = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Starts watching; call it on the loop's own thread."""
+        if self.running:
+            return
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._beat = time.monotonic()
+        self.started_at = time.time()
+        self._handle = loop.call_later(self.interval, self._heartbeat)
+        self._thread = threading.Thread(target=self._watch, args=(self._stop,), name="loop-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop profiler started (stalls over {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._handle.cancel()
+        self._thread = None
+        logger.info("Loop profiler stopped")
+
+    def reset(self):
+        with self._lock:
+            self.stalls.clear()
+            self.totals.clear()
+            self.max_lag = 0.0
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return list(self.stalls), {key: list(value) for key, value in self.totals.items()}
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        self.max_lag = max(self.max_lag, now - self._beat - self.interval)
+        self._beat = now
+        self._handle = self._loop.call_later(self.interval, self._heartbeat)
+
+    def _watch(self, stop: threading.Event):
+        stall = None
+        while not stop.wait(self.interval):
+            behind = time.monotonic() - self._beat - self.interval
+            if behind < self.threshold:
+                if stall:
+                    self._finish(stall)
+                    stall = None
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            if stall is None:
+                stall = {"started_at": time.time() - behind, "command": self._current_command(), "samples": {}}
+            where = self._attribute(frame)
+            stall["samples"][where] = stall["samples"].get(where, 0) + 1
+            stall["duration"] = behind
+            del frame
+
+    def _current_command(self) -> str:
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            return "(callback)"
+        return task_labels.get(task) or task.get_name()
+
+    @classmethod
+    def _attribute(cls, frame) -> tuple:
+        # The innermost frame is what's blocking; the innermost bot frame is what called it
+        call = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+        while frame is not None and frame.f_code.co_filename != cls.SOURCE_FILE:
+            frame = frame.f_back
+        site = f"{frame.f_code.co_name}:{frame.f_lineno}" if frame is not None else "(outside the bot)"
+        return site, call
+
+    def _finish(self, stall: Dict):
+        (site, call), _ = max(stall.pop("samples").items(), key=lambda item: item[1])
+        stall.update(site=site, call=call)
+        key = (stall["command"], site, call)
+        with self._lock:
+            self.stalls.append(stall)
+            totals = self.totals.setdefault(key, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += stall["duration"]
+            totals[2] = max(totals[2], stall["duration"])
+        self._loop.call_soon_threadsafe(functools.partial(LOOP_STALL_SECONDS.observe, stall["duration"], command=stall["command"]))
+        logger.warning(f"Event loop blocked for {stall['duration'] * 1000:.0f}ms in {stall['command']} at {site} ({call})")
+
+loop_profiler = LoopProfiler(PROFILER_STALL_THRESHOLD, PROFILER_SAMPLE_INTERVAL, PROFILER_HISTORY)
+
+# Docker access
+class DockerTimeout(docker.errors.DockerException):
+    def __init__(self, operation: str, timeout: float):
+        super().__init__(f"Docker {operation} timed out after {timeout}s")
+        self.operation = operation
+        self.timeout = timeout
+
+class AsyncDocker:
+    """Runs blocking Docker SDK calls on a bounded thread pool with per-operation timeouts.
+
+    A timed-out call keeps its worker thread until the daemon answers, but the
+    awaiting handler is released and the event loop never blocks.
+    """
+
+    def __init__(self, client_factory, max_workers: int, timeouts: Dict[str, float]):
+        self._client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="docker"
+        )
+        self.timeouts = timeouts
+
+    @property
+    def client(self) -> docker.DockerClient:
+        # Created lazily on a worker thread so connecting never blocks the loop
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    async def call(self, operation: str, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        timeout = self.timeouts.get(operation, self.timeouts["default"])
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            DOCKER_CALL_ERRORS.inc(operation=operation, reason="timeout")
+            logger.error(f"Docker {operation} timed out after {timeout}s")
+            raise DockerTimeout(operation, timeout)
+        except docker.errors.DockerException:
+            DOCKER_CALL_ERRORS.inc(operation=operation, reason="error")
+            raise
+        finally:
+            DOCKER_CALL_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+    async def get_container(self, container_id: str):
+        return await self.call("get", lambda: self.client.containers.get(container_id))
+
+    async def list_containers(self, **kwargs) -> List:
+        return await self.call("list", lambda: self.client.containers.list(**kwargs))
+
+    async def get_image(self, image: str):
+        return await self.call("get", lambda: self.client.images.get(image))
+
+    async def pull_image(self, repository: str, tag: str, on_event=None):
+        """Pulls with the streaming API, handing each progress event to ``on_event`` on the worker thread."""
+        def pull():
+            for event in self.client.api.pull(repository, tag=tag, stream=True, decode=True):
+                if "error" in event:
+                    raise docker.errors.APIError(event["error"])
+                if on_event:
+                    on_event(event)
+        return await self.call("pull", pull)
+
+    async def tag_image(self, image: str, repository: str, tag: str):
+        return await self.call("default", lambda: self.client.api.tag(image, repository, tag))
+
+    async def run_container(self, image: str, **kwargs):
+        return await self.call("run", lambda: self.client.containers.run(image, **kwargs))
+
+    async def start(self, container):
+        return await self.call("start", container.start)
+
+    async def stop(self, container):
+        return await self.call("stop", container.stop)
+
+    async def restart(self, container):
+        return await self.call("restart", container.restart)
+
+    async def rename(self, container, name: str):
+        return await self.call("default", container.rename, name)
+
+    async def remove(self, container, **kwargs):
+        return await self.call("remove", container.remove, **kwargs)
+
+    async def stats(self, container) -> Dict:
+        return await self.call("stats", container.stats, stream=False)
+
+    async def exec_create(self, container_id: str, cmd: List[str]) -> str:
+        result = await self.call("exec", lambda: self.client.api.exec_create(container_id, cmd, stdout=True, stderr=True))
+        return result["Id"]
+
+    async def exec_start_socket(self, exec_id: str):
+        return await self.call("exec", lambda: self.client.api.exec_start(exec_id, socket=True))
+
+    async def exec_inspect(self, exec_id: str) -> Dict:
+        return await self.call("exec", lambda: self.client.api.exec_inspect(exec_id))
+
+    async def exec_run(self, container_id: str, cmd: List[str]) -> bytes:
+        exec_id = await self.exec_create(container_id, cmd)
+        return await self.call("exec", lambda: self.client.api.exec_start(exec_id))
+
+    async def info(self) -> Dict:
+        return await self.call("info", lambda: self.client.info())
+
+    async def prune_images(self) -> Dict:
+        return await self.call("prune", lambda: self.client.images.prune(filters={"dangling": True}))
+
+    async def prune_volumes(self) -> Dict:
+        return await self.call("prune", lambda: self.client.volumes.prune())
+
+def docker_client_factory(settings: Dict):
+    if not settings.get("base_url"):
+        return docker.from_env
+    tls = False
+    if settings.get("tls_cert") or settings.get("tls_ca"):
+        tls = docker.tls.TLSConfig(
+            client_cert=(settings["tls_cert"], settings["tls_key"]) if settings.get("tls_cert") else None,
+            ca_cert=settings.get("tls_ca"),
+            verify=settings.get("tls_ca") or False
+        )
+    return functools.partial(docker.DockerClient, base_url=settings["base_url"], tls=tls)
+
+class DockerHost:
+    def __init__(self, name: str, settings: Dict, api: AsyncDocker):
+        self.name = name
+        self.settings = settings
+        self.api = api
+        self.cpus: Optional[int] = None  # From `docker info`, unknown until the first refresh
+        self.memory: Optional[int] = None
+        self.reachable = False
+        self.draining = False  # Dropped from the config: keeps its instances, gets no new ones
+        self.reserved_memory = 0  # Deployments and warm instances the stats don't cover yet
+        self.starting_memory = 0  # The deployments among those, which haven't allocated it either
+        # Docker on this machine: psutil reads its free memory directly when placing
+        self.local = not settings.get("base_url", "unix://").startswith(("tcp://", "ssh://", "http"))
+        self.available_memory: Optional[int] = None  # Remote hosts' MemAvailable, read on refresh
+
+class DockerHostRegistry:
+    """The Docker daemons instances run on, and which one each instance lives on.
+
+    Lifecycle calls go through ``for_container``, which follows the host recorded
+    in the store (or noted with ``track`` for containers that aren't stored yet).
+    ``place`` picks a host for a new instance from the hosts' capacity and the
+    latest stats samples of the instances already on them.
+    """
+
+    def __init__(self, hosts: Dict[str, Dict], max_workers: int, timeouts: Dict[str, float]):
+        self.max_workers = max_workers
+        self.hosts: Dict[str, DockerHost] = {}
+        # Instances stored before hosts were recorded live on the first configured host
+        self.default = next(iter(hosts))
+        self._tracked: Dict[str, str] = {}
+        self._unplaceable: set = set()
+        self.configure(hosts, timeouts)
+
+    def configure(self, hosts: Dict[str, Dict], timeouts: Dict[str, float]):
+        for name, settings in hosts.items():
+            host = self.hosts.get(name)
+            if host is None:
+                api = AsyncDocker(docker_client_factory(settings), self.max_workers, timeouts)
+                self.hosts[name] = DockerHost(name, settings, api)
+                continue
+            if host.settings != settings:
+                logger.warning(f"Docker host {name} changed its connection settings; that takes a restart")
+            host.api.timeouts = timeouts
+            host.draining = False
+        for name, host in self.hosts.items():
+            if name not in hosts and not host.draining:
+                logger.info(f"Docker host {name} left the config; it keeps its instances but gets no new ones")
+                host.draining = True
+
+    def get(self, host_name: Optional[str]) -> DockerHost:
+        return self.hosts.get(host_name) or self.hosts[self.default]
+
+    def host_of(self, container_id: str) -> str:
+        record = db.get(container_id)
+        if record and record.get("host"):
+            return record["host"]
+        return self._tracked.get(container_id, self.default)
+
+    def for_container(self, container_id: str) -> AsyncDocker:
+        return self.get(self.host_of(container_id)).api
+
+    def track(self, container_id: str, host_name: str):
+        self._tracked[container_id] = host_name
+
+    def forget(self, container_id: str):
+        self._tracked.pop(container_id, None)
+
+    def is_tracked(self, container_id: str) -> bool:
+        return container_id in self._tracked
+
+    def reserve(self, host_name: str, memory: int, starting: bool = False):
+        host = self.get(host_name)
+        host.reserved_memory += memory
+        if starting:
+            host.starting_memory += memory
+
+    def release(self, host_name: str, memory: int, starting: bool = False):
+        host = self.get(host_name)
+        host.reserved_memory -= memory
+        if starting:
+            host.starting_memory -= memory
+
+    async def list_containers(self, **kwargs) -> Dict[str, List]:
+        """Containers per reachable host; hosts that fail are logged and left out."""
+        hosts = list(self.hosts.values())
+        results = await asyncio.gather(*(host.api.list_containers(**kwargs) for host in hosts), return_exceptions=True)
+        listing = {}
+        for host, result in zip(hosts, results):
+            if isinstance(result, Exception):
+                logger.error(f"Could not list containers on Docker host {host.name}: {result}")
+            else:
+                listing[host.name] = result
+        return listing
+
+    async def refresh(self):
+        async def check(host: DockerHost):
+            try:
+                info = await host.api.info()
+            except Exception as e:
+                if host.reachable:
+                    logger.error(f"Docker host {host.name} is unreachable: {e}")
+                host.reachable = False
+                return
+            host.cpus = info.get("NCPU") or 1
+            host.memory = info.get("MemTotal") or 0
+            if not host.local:
+                host.available_memory = await self._read_available_memory(host)
+            if not host.reachable:
+                logger.info(f"Docker host {host.name} is up with {host.cpus} CPUs and {format_size(host.memory)} memory")
+            host.reachable = True
+        
+        await asyncio.gather(*(check(host) for host in self.hosts.values()))
+        
+        # Profiles no host could ever run are worth shouting about, once
+        usable = [host for host in self.hosts.values() if host.reachable and not host.draining]
+        unplaceable = set()
+        for profile_name, profile in RESOURCE_PROFILES.items():
+            if usable and not any(profile["cpus"] <= host.cpus and profile["memory"] <= host.memory for host in usable):
+                unplaceable.add(profile_name)
+        for profile_name in unplaceable - self._unplaceable:
+            logger.error(f"Profile '{profile_name}' is bigger than every Docker host, so it can't be deployed")
+        self._unplaceable = unplaceable
+
+    async def _read_available_memory(self, host: DockerHost) -> Optional[int]:
+        """MemAvailable of a remote host, read inside one of its ready warm instances.
+
+        /proc/meminfo isn't namespaced, so a container sees the host's figures.
+        Only instances no user has been handed are trusted: users have root in
+        theirs and could report anything, or make the read hang. Without a warm
+        instance None leaves ``place`` with the estimate from the stats alone.
+        """
+        for container_id in warm_pool.ready_on(host.name)[:3]:
+            try:
+                meminfo = await host.api.exec_run(container_id, ["cat", "/proc/meminfo"])
+            except Exception as e:
+                logger.debug(f"Could not read /proc/meminfo in {container_id[:12]} on {host.name}: {e}")
+                continue
+            for line in meminfo.decode(errors="replace").splitlines():
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+        return None
+
+    def free_memory(self, host: DockerHost, memory_used: int) -> int:
+        """Bytes a new instance on ``host`` can count on.
+
+        The smaller of two views: the host's memory less ``memory_used`` (the
+        sampled usage of our instances) and what's reserved, and what the kernel
+        says is available (``psutil`` here, MemAvailable from the last refresh on
+        remote hosts) less the deployments still starting. The first misses
+        everything that isn't ours; the second misses memory our starting
+        instances haven't touched yet.
+        """
+        free_memory = host.memory - memory_used - host.reserved_memory
+        available = psutil.virtual_memory().available if host.local else host.available_memory
+        if available is not None:
+            free_memory = min(free_memory, available - host.starting_memory)
+        return free_memory
+
+    def usage(self, host_name: str) -> tuple:
+        """Latest sampled memory (bytes) and CPU (percent of one core) of the stored instances on a host."""
+        container_ids = db.on_host(host_name)
+        if host_name == self.default:
+            container_ids = container_ids + db.on_host(None)
+        memory = cpu = 0
+        for container_id in container_ids:
+            sample = stats_cache.latest(container_id)
+            if sample:
+                memory += sample['memory_usage']
+                cpu += sample['cpu_percent']
+        return memory, cpu
+
+    def place(self, profile: Dict, headroom: int = 0, max_cpu_percent: Optional[float] = None) -> Optional[str]:
+        """Picks a host with room for ``profile`` plus ``headroom`` bytes, or None if there's none."""
+        candidates = []
+        for host in self.hosts.values():
+            if not host.reachable or host.draining or profile["cpus"] > host.cpus:
+                continue
+            memory_used, cpu_percent = self.usage(host.name)
+            free_memory = self.free_memory(host, memory_used)
+            leftover = free_memory - profile["memory"] - headroom
+            if leftover < 0:
+                continue
+            if max_cpu_percent is not None and cpu_percent / host.cpus >= max_cpu_percent:
+                continue
+            candidates.append((leftover, free_memory / host.memory, host.name))
+        if not candidates:
+            return None
+        if PLACEMENT_STRATEGY == "least-loaded":
+            return max(candidates, key=lambda candidate: candidate[1])[2]
+        # Best fit: the host left with the least room, keeping big gaps for big instances
+        return min(candidates)[2]
+
+docker_hosts = DockerHostRegistry(DOCKER_HOSTS, DOCKER_POOL_SIZE, DOCKER_TIMEOUTS)
+
+# Access checks
+def is_admin(user_id: int) -> bool:
+    return user_id in ADMIN_IDS
+
+def in_allowed_place(interaction: discord.Interaction) -> bool:
+    if ALLOWED_GUILD_IDS and interaction.guild_id not in ALLOWED_GUILD_IDS:
+        return False
+    return interaction.channel_id in ALLOWED_CHANNEL_IDS
+
+# Embed templates
+# Static embeds are built once at startup and shared between requests, so they
+# must never be mutated. Embeds with per-request content are built on demand.
+def error_embed(title: str, description: str) -> discord.Embed:
+    return discord.Embed(title=title, description=description, color=COLORS['error'])
+
+def _wrong_channel_embed() -> discord.Embed:
+    return discord.Embed(
+        title="🚫 Wrong Channel, sweetie!",
+        description="This command can only be used in the designated NXH-i7 channel! 💔",
+        color=COLORS['error']
+    )
+
+def _not_found_embed() -> discord.Embed:
+    return discord.Embed(
+        title="🔍 Instance Not Found",
+        description="No adorable instance found with that ID, sweetie! 🥺",
+        color=COLORS['error']
+    )
+
+def _gone_embed() -> discord.Embed:
+    return discord.Embed(
+        title="😿 Instance Not Found",
+        description="The container no longer exists, sweetie!",
+        color=COLORS['error']
+    )
+
+def _no_permission_manage_embed() -> discord.Embed:
+    return discord.Embed(
+        title="🚫 Permission Denied",
+        description="You don't have permission to manage this cute instance! 💔",
+        color=COLORS['error']
+    )
+
+def _no_permission_view_embed() -> discord.Embed:
+    return discord.Embed(
+        title="🚫 Permission Denied",
+        description="You don't have permission to view this cute instance! 💔",
+        color=COLORS['error']
+    )
+
+def _admin_only_embed() -> discord.Embed:
+    return discord.Embed(
+        title="🚫 Access Denied",
+        description="This command is for admins only, cutie! 💖",
+        color=COLORS['error']
+    )
+
+def _invalid_image_embed() -> discord.Embed:
+    return discord.Embed(
+        title="😿 Invalid Image",
+        description="The selected image isn't available right now, cutie!",
+        color=COLORS['error']
+    )
+
+def _instance_limit_embed() -> discord.Embed:
+    embed = error_embed("🥺 Instance Limit Reached", f"You can only have {SERVER_LIMIT} adorable instances at a time, sweetie! 💔")
+    embed.add_field(name="💡 Tip", value="Remove an existing instance to make room for a new one! 🌸", inline=False)
+    return embed
+
+def _no_instances_embed() -> discord.Embed:
+    embed = discord.Embed(
+        title="🥺 No Instances Found",
+        description="You don't have any cute instances yet! Use `/deploy` to create your first one~ 💖",
+        color=COLORS['yellow']
+    )
+    embed.add_field(
+        name="✨ Getting Started",
+        value="Type `/deploy` to begin your magical journey! 🌟",
+        inline=False
+    )
+    return embed
+
+def _deploy_welcome_embed() -> discord.Embed:
+    embed = discord.Embed(
+        title="✨ Welcome to NXH-i7! ✨",
+        description="Let's create something magical together~ Choose your perfect OS image! 💖",
+        color=COLORS['pink']
+    )
+    embed.add_field(
+        name="🌸 What's NXH-i7?",
+        value="Your cute cloud companion for creating adorable instances! 🐱",
+        inline=False
+    )
+    embed.add_field(
+        name="⏰ Time Limit",
+        value="You have 60 seconds to choose, cutie!",
+        inline=False
+    )
+    return embed
+
+def _help_embed() -> discord.Embed:
+    embed = discord.Embed(
+        title="💖 NXH-i7 Help Center 💖",
+        description="Your guide to managing adorable cloud instances~ Let me show you all the magical commands! ✨",
+        color=COLORS['pink']
+    )
+    
+    embed.add_field(
+        name="🚀 `/deploy`",
+        value="Create a new adorable instance with our cute interface! 💖",
+        inline=False
+    )
+    embed.add_field(
+        name="📋 `/list`",
+        value="See all your precious instances in one place~ 🌸",
+        inline=False
+    )
+    embed.add_field(
+        name="ℹ️ `/info <id>`",
+        value="Get detailed info about any of your cute instances! 💡",
+        inline=False
+    )
+    embed.add_field(
+        name="💚 `/start <id>`",
+        value="Wake up a sleeping instance~ Rise and shine! ☀️",
+        inline=False
+    )
+    embed.add_field(
+        name="💤 `/stop <id>`",
+        value="Put an instance to sleep peacefully~ Sweet dreams! 🌙",
+        inline=False
+    )
+    embed.add_field(
+        name="🔄 `/restart <id>`",
+        value="Give your instance a fresh start with new energy! ✨",
+        inline=False
+    )
+    embed.add_field(
+        name="🔑 `/regen-ssh <id>`",
+        value="Create brand new SSH access magic~ Keep it secret! 🤫",
+        inline=False
+    )
+    embed.add_field(
+        name="💔 `/remove <id>`",
+        value="Say goodbye to an instance (this is permanent!) 😢",
+        inline=False
+    )
+    embed.add_field(
+        name="📊 `/stats`",
+        value="Check how our magical system is performing~ 💖",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="💡 Tips & Tricks",
+        value=f"• Keep your SSH commands safe! 🔐\n• You can have up to {SERVER_LIMIT} instances~ 🌸\n• DMs contain important info! 💌\n• Use short IDs (first 12 characters) 📝",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="🆘 Need More Help?",
+        value="If something's not working, try again in a moment~ Our magic sometimes needs a second! ✨",
+        inline=False
+    )
+    return embed
+
+def format_size(size: int) -> str:
+    if size >= 1024 ** 3:
+        return f"{size / 1024 ** 3:g}GB"
+    return f"{size / 1024 ** 2:g}MB"
+
+def describe_profile(profile: Dict) -> str:
+    swap = profile["memory_swap"] - profile["memory"]
+    parts = [
+        f"{format_size(profile['memory'])} RAM",
+        f"{profile['cpus']:g} CPU",
+        f"{profile['pids']} processes",
+    ]
+    if swap:
+        parts.append(f"{format_size(swap)} swap")
+    if profile["disk"]:
+        parts.append(f"{profile['disk']} disk")
+    return " | ".join(parts)
+
+def _image_choice_embed(img_data: Dict) -> discord.Embed:
+    embed = discord.Embed(
+        title="🌟 Perfect Choice!",
+        description=f"**{img_data['display_name']}** is ready to deploy~ 💖",
+        color=COLORS['success']
+    )
+    embed.add_field(name="✨ Description", value=img_data["description"], inline=False)
+    if len(img_data["profiles"]) == 1:
+        embed.add_field(name="🎀 Resources", value=describe_profile(RESOURCE_PROFILES[img_data["profiles"][0]]), inline=False)
+    else:
+        sizes = "\n".join(
+            f"**{RESOURCE_PROFILES[profile_name]['display_name']}**: {describe_profile(RESOURCE_PROFILES[profile_name])}"
+            for profile_name in img_data["profiles"]
+        )
+        embed.add_field(name="🎀 Sizes (pick one below, the first is the default)", value=sizes, inline=False)
+    return embed
+
+def _deploying_embed(img_data: Dict) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"✨ Creating Your {img_data['display_name']} Instance",
+        description="Your magical instance is being prepared with love~ 💖",
+        color=COLORS['info']
+    )
+    embed.add_field(name="🌟 Status", value="🔄 Sprinkling magic dust...", inline=False)
+    return embed
+
+def embed_builders() -> Dict[str, object]:
+    builders = {
+        'wrong_channel': _wrong_channel_embed,
+        'not_found': _not_found_embed,
+        'gone': _gone_embed,
+        'no_permission_manage': _no_permission_manage_embed,
+        'no_permission_view': _no_permission_view_embed,
+        'admin_only': _admin_only_embed,
+        'invalid_image': _invalid_image_embed,
+        'instance_limit': _instance_limit_embed,
+        'no_instances': _no_instances_embed,
+        'deploy_welcome': _deploy_welcome_embed,
+        'help': _help_embed,
+    }
+    for image_name, img_data in DOCKER_IMAGES.items():
+        builders[f'image_choice:{image_name}'] = functools.partial(_image_choice_embed, img_data)
+    return builders
+
+def build_image_select_options() -> List[discord.SelectOption]:
+    return [
+        discord.SelectOption(
+            label=img["display_name"],
+            description=img["description"][:100],
+            value=img_name,
+            emoji="💖"
+        ) for img_name, img in DOCKER_IMAGES.items()
+    ]
+
+def build_tier_select_options() -> Dict[str, List[discord.SelectOption]]:
+    # Only images offering more than one profile get a size picker
+    return {
+        img_name: [
+            discord.SelectOption(
+                label=RESOURCE_PROFILES[profile_name]["display_name"],
+                description=describe_profile(RESOURCE_PROFILES[profile_name])[:100],
+                value=profile_name,
+                emoji="🎀"
+            ) for profile_name in img["profiles"]
+        ] for img_name, img in DOCKER_IMAGES.items() if len(img["profiles"]) > 1
+    }
+
+def build_embeds() -> Dict[str, discord.Embed]:
+    return {key: build() for key, build in embed_builders().items()}
+
+EMBEDS: Dict[str, discord.Embed] = build_embeds()
+IMAGE_SELECT_OPTIONS = build_image_select_options()
+TIER_SELECT_OPTIONS = build_tier_select_options()
+
+def benchmark_embeds(iterations: int = 20000):
+    """Per-interaction CPU cost of building embeds each time vs. sharing the templates (Embed.copy() for reference)."""
+    import timeit
+    print(f"{'template':<32}{'rebuild (us)':>14}{'shared (us)':>14}{'copy (us)':>12}")
+    for key, build in embed_builders().items():
+        template = EMBEDS[key]
+        rebuild = timeit.timeit(build, number=iterations) / iterations * 1e6
+        shared = timeit.timeit(lambda: EMBEDS[key], number=iterations) / iterations * 1e6
+        copied = timeit.timeit(template.copy, number=iterations) / iterations * 1e6
+        print(f"{key:<32}{rebuild:>14.2f}{shared:>14.2f}{copied:>12.2f}")
+    rebuild = timeit.timeit(build_image_select_options, number=iterations) / iterations * 1e6
+    cached = timeit.timeit(lambda: list(IMAGE_SELECT_OPTIONS), number=iterations) / iterations * 1e6
+    print(f"{'image select options':<32}{rebuild:>14.2f}{cached:>14.2f}{'-':>12}")
+
+class ImageSelectView(View):
+    def __init__(self, user_id: int):
+        super().__init__(timeout=60)
+        self.user_id = user_id
+        self.selected_image = None
+        self.selected_tier = None
+        self.tier_select = None
+        
+        # Create a dropdown for image selection
+        select = Select(
+            placeholder="Choose your perfect OS image~ 🌸",
+            options=list(IMAGE_SELECT_OPTIONS),
+            row=0
+        )
+        select.callback = self.select_callback
+        self.add_item(select)
+        
+        # Add deploy button
+        deploy_button = Button(label="Deploy My Instance!", style=discord.ButtonStyle.green, emoji="✨", row=2)
+        deploy_button.callback = self.deploy_callback
+        self.add_item(deploy_button)
+    
+    async def select_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("💔 This isn't your deployment, sweetie!", ephemeral=True)
+            return
+            
+        self.selected_image = interaction.data['values'][0]
+        embed = EMBEDS[f"image_choice:{self.selected_image}"]
+        
+        # Swap in the size picker for this image, if it has more than one size
+        if self.tier_select:
+            self.remove_item(self.tier_select)
+            self.tier_select = None
+        self.selected_tier = None
+        tier_options = TIER_SELECT_OPTIONS.get(self.selected_image)
+        if tier_options:
+            self.tier_select = Select(placeholder="Pick a size~ 🎀", options=list(tier_options), row=1)
+            self.tier_select.callback = self.tier_callback
+            self.add_item(self.tier_select)
+        
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    async def tier_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("💔 This isn't your deployment, sweetie!", ephemeral=True)
+            return
+        
+        self.selected_tier = interaction.data['values'][0]
+        await interaction.response.defer()
+    
+    async def deploy_callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("💔 This isn't your deployment, sweetie!", ephemeral=True)
+            return
+            
+        if not self.selected_image:
+            await interaction.response.send_message("🥺 Please select an image first, cutie!", ephemeral=True)
+            return
+            
+        await interaction.response.defer()
+        await create_server_task(interaction, self.selected_image, self.selected_tier)
+        self.stop()
+
+# Database
+# Instances live in a SQLite file (WAL mode) and are mirrored in memory, so
+# lookups never touch disk and every write only persists the row it changed.
+class InstanceStore:
+    COLUMNS = (
+        "container_id", "user_id", "ssh_command", "image", "created_at", "status", "profile", "host",
+        "hibernated_at", "expires_at"
+    )
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS containers ("
+            "container_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, ssh_command TEXT, "
+            "image TEXT, created_at TEXT, status TEXT)"
+        )
+        # Columns added since the table was first created
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(containers)")}
+        for column in self.COLUMNS:
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE containers ADD COLUMN {column} TEXT")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        self._by_id: Dict[str, Dict] = {}
+        self._by_user: Dict[str, Dict[str, Dict]] = {}
+        self._by_status: Dict[str, set] = {}
+        self._by_host: Dict[Optional[str], set] = {}
+        # Sorted container IDs (globally and per user) for prefix lookups
+        self._sorted_ids: List[str] = []
+        self._sorted_ids_by_user: Dict[str, List[str]] = {}
+        self._listeners: List = []
+
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM containers ORDER BY rowid"
+        for row in self._conn.execute(query):
+            self._index(dict(zip(self.COLUMNS, row)))
+
+    def _index(self, record: Dict):
+        self._by_id[record["container_id"]] = record
+        self._by_user.setdefault(record["user_id"], {})[record["container_id"]] = record
+        self._by_status.setdefault(record["status"], set()).add(record["container_id"])
+        self._by_host.setdefault(record["host"], set()).add(record["container_id"])
+        bisect.insort(self._sorted_ids, record["container_id"])
+        bisect.insort(self._sorted_ids_by_user.setdefault(record["user_id"], []), record["container_id"])
+
+    def _unindex(self, record: Dict):
+        self._by_id.pop(record["container_id"], None)
+        user_containers = self._by_user.get(record["user_id"], {})
+        user_containers.pop(record["container_id"], None)
+        if not user_containers:
+            self._by_user.pop(record["user_id"], None)
+        self._by_status.get(record["status"], set()).discard(record["container_id"])
+        self._by_host.get(record["host"], set()).discard(record["container_id"])
+        _sorted_remove(self._sorted_ids, record["container_id"])
+        user_ids = self._sorted_ids_by_user.get(record["user_id"], [])
+        _sorted_remove(user_ids, record["container_id"])
+        if not user_ids:
+            self._sorted_ids_by_user.pop(record["user_id"], None)
+
+    def subscribe(self, listener):
+        """Calls ``listener(record)`` after every write that touches a record."""
+        self._listeners.append(listener)
+
+    def _notify(self, record: Dict):
+        for listener in self._listeners:
+            listener(record)
+
+    def add(self, record: Dict):
+        record = {column: record.get(column) for column in self.COLUMNS}
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO containers ({', '.join(self.COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+            [record[column] for column in self.COLUMNS]
+        )
+        existing = self._by_id.get(record["container_id"])
+        if existing:
+            self._unindex(existing)
+            self._notify(existing)
+        self._index(record)
+        self._notify(record)
+
+    def remove(self, container_id: str) -> Optional[Dict]:
+        record = self._by_id.get(container_id)
+        if not record:
+            return None
+        self._conn.execute("DELETE FROM containers WHERE container_id = ?", (container_id,))
+        self._unindex(record)
+        self._notify(record)
+        return record
+
+    def update(self, container_id: str, **fields) -> Optional[Dict]:
+        record = self._by_id.get(container_id)
+        if not record:
+            return None
+        changed = {k: v for k, v in fields.items() if k in self.COLUMNS and record.get(k) != v}
+        if not changed:
+            return record
+        assignments = ', '.join(f"{column} = ?" for column in changed)
+        self._conn.execute(
+            f"UPDATE containers SET {assignments} WHERE container_id = ?",
+            [*changed.values(), container_id]
+        )
+        if "status" in changed:
+            self._by_status.get(record["status"], set()).discard(container_id)
+            self._by_status.setdefault(changed["status"], set()).add(container_id)
+        if "host" in changed:
+            self._by_host.get(record["host"], set()).discard(container_id)
+            self._by_host.setdefault(changed["host"], set()).add(container_id)
+        record.update(changed)
+        self._notify(record)
+        return record
+
+    def get(self, container_id: str) -> Optional[Dict]:
+        return self._by_id.get(container_id)
+
+    def for_user(self, user_id: str) -> List[Dict]:
+        return list(self._by_user.get(str(user_id), {}).values())
+
+    def count_for_user(self, user_id: str) -> int:
+        return len(self._by_user.get(str(user_id), {}))
+
+    def owner(self, container_id: str) -> Optional[str]:
+        record = self._by_id.get(container_id)
+        return record["user_id"] if record else None
+
+    def with_status(self, status: str) -> List[Dict]:
+        return [self._by_id[cid] for cid in self._by_status.get(status, ())]
+
+    def on_host(self, host_name: Optional[str]) -> List[str]:
+        return list(self._by_host.get(host_name, ()))
+
+    def by_user(self) -> Dict[str, List[Dict]]:
+        return {user_id: list(containers.values()) for user_id, containers in self._by_user.items()}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def resolve(self, prefix: str, user_id: Optional[str] = None) -> Optional[str]:
+        """Full container ID for a unique ID prefix, or None if nothing matches.
+
+        Raises AmbiguousContainerId when the prefix matches several instances.
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return None
+        ids = self._sorted_ids if user_id is None else self._sorted_ids_by_user.get(str(user_id), [])
+        start, end = _prefix_range(ids, prefix)
+        if end - start > 1:
+            raise AmbiguousContainerId(prefix, end - start)
+        return ids[start] if end > start else None
+
+    def with_prefix(self, prefix: str, user_id: Optional[str] = None, limit: int = 25) -> List[str]:
+        ids = self._sorted_ids if user_id is None else self._sorted_ids_by_user.get(str(user_id), [])
+        start, end = _prefix_range(ids, prefix.strip().lower())
+        return ids[start:min(end, start + limit)]
+
+    def meta_value(self, key: str, default_factory) -> str:
+        """A value from the meta table, stored from ``default_factory()`` the first time it's asked for."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row:
+            return row[0]
+        value = default_factory()
+        self._conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, value))
+        return value
+
+    def import_json(self, path: str) -> int:
+        """One-time import of a legacy ``database.json`` ({user_id: [container, ...]})."""
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return 0
+
+        imported = 0
+        data = load_legacy_database(path)
+        self._conn.execute("BEGIN")
+        try:
+            for user_id, containers in data.items():
+                for container in containers:
+                    if "container_id" not in container:
+                        continue
+                    self.add({
+                        **container,
+                        "user_id": str(user_id),
+                        "status": container.get("status", "running")
+                    })
+                    imported += 1
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+                (datetime.datetime.now().isoformat(),)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return imported
+
+class AmbiguousContainerId(Exception):
+    def __init__(self, prefix: str, matches: int):
+        super().__init__(f"'{prefix}' matches {matches} instances")
+        self.prefix = prefix
+        self.matches = matches
+
+def _prefix_range(sorted_ids: List[str], prefix: str) -> tuple:
+    start = bisect.bisect_left(sorted_ids, prefix)
+    end = bisect.bisect_left(sorted_ids, prefix + '\uffff', lo=start)
+    return start, end
+
+def _sorted_remove(sorted_ids: List[str], value: str):
+    index = bisect.bisect_left(sorted_ids, value)
+    if index < len(sorted_ids) and sorted_ids[index] == value:
+        del sorted_ids[index]
+
+def load_legacy_database(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    
+    with open(path, 'r') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+db = InstanceStore(DATABASE_FILE)
+imported_count = db.import_json(LEGACY_DATABASE_FILE)
+if imported_count:
+    logger.info(f"Imported {imported_count} instances from {LEGACY_DATABASE_FILE}")
+bot_instance_id = BOT_INSTANCE_ID or db.meta_value('bot_instance_id', lambda: uuid.uuid4().hex[:12])
+
+def add_to_database(user_id: str, container_id: str, ssh_command: str, image_name: str, profile_name: Optional[str] = None, host_name: Optional[str] = None):
+    now = datetime.datetime.now()
+    db.add({
+        "container_id": container_id,
+        "user_id": str(user_id),
+        "ssh_command": ssh_command,
+        "image": image_name,
+        "created_at": now.isoformat(),
+        "status": "running",
+        "profile": profile_name,
+        "host": host_name,
+        "expires_at": (now + datetime.timedelta(seconds=INSTANCE_TTL)).isoformat() if INSTANCE_TTL else None
+    })
+    docker_hosts.forget(container_id)
+
+def remove_from_database(container_id: str):
+    db.remove(container_id)
+
+def update_container_status(container_id: str, status: str):
+    db.update(container_id, status=status)
+
+def update_container_ssh(container_id: str, ssh_command: str):
+    db.update(container_id, ssh_command=ssh_command)
+
+def update_container_hibernation(container_id: str, hibernated_at: Optional[str]):
+    db.update(container_id, hibernated_at=hibernated_at)
+
+def get_user_containers(user_id: str) -> List[Dict]:
+    return db.for_user(user_id)
+
+def count_user_containers(user_id: str) -> int:
+    return db.count_for_user(user_id)
+
+def get_container_info(container_id: str) -> Optional[Dict]:
+    container = db.get(container_id)
+    return dict(container) if container else None
+
+async def resolve_container_id(interaction: discord.Interaction, container_id: str) -> Optional[str]:
+    """Expands a (short) instance ID, telling the user if it's unknown or ambiguous."""
+    try:
+        # Prefer the caller's own instances so their short IDs stay unique
+        full_id = db.resolve(container_id, str(interaction.user.id)) or db.resolve(container_id)
+    except AmbiguousContainerId as e:
+        embed = error_embed("🤔 Which One, Sweetie?", f"`{e.prefix}` matches {e.matches} instances~ Please type a few more characters! 🌸")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return None
+    
+    if not full_id:
+        await interaction.response.send_message(embed=EMBEDS['not_found'], ephemeral=True)
+        return None
+    return full_id
+
+async def authorize_instance(interaction: discord.Interaction, container_id: str, view_only: bool = False) -> Optional[str]:
+    """Expands an instance ID and checks the caller owns it (or is an admin).
+
+    Only the in-memory indexes are consulted. Returns the full ID, or None after
+    telling the user why not.
+    """
+    container_id = await resolve_container_id(interaction, container_id)
+    if not container_id:
+        return None
+    
+    if db.owner(container_id) != str(interaction.user.id) and not is_admin(interaction.user.id):
+        key = 'no_permission_view' if view_only else 'no_permission_manage'
+        await interaction.response.send_message(embed=EMBEDS[key], ephemeral=True)
+        return None
+    return container_id
+
+class InstanceChoiceCache:
+    """Autocomplete choices (ID, image display name, status) per user, kept in memory.
+
+    A user's entries are rebuilt only after a store write touches one of their
+    instances, so answering a keystroke never reads disk or asks Docker.
+    """
+
+    def __init__(self, store: InstanceStore):
+        self._store = store
+        self._by_user: Dict[str, List[tuple]] = {}
+        store.subscribe(self.invalidate)
+
+    def invalidate(self, record: Optional[Dict] = None):
+        if record is None:
+            self._by_user.clear()
+        else:
+            self._by_user.pop(record["user_id"], None)
+
+    @staticmethod
+    def _choice(record: Dict) -> app_commands.Choice:
+        image_data = DOCKER_IMAGES.get(record["image"], {})
+        name = f"{image_data.get('display_name', 'Cute Instance')} · {record['container_id'][:12]} · {record['status']}"
+        return app_commands.Choice(name=name[:100], value=record["container_id"])
+
+    def for_user(self, user_id: str) -> List[tuple]:
+        entries = self._by_user.get(user_id)
+        CACHE_REQUESTS.inc(cache="autocomplete", result="miss" if entries is None else "hit")
+        if entries is None:
+            entries = [
+                (record["container_id"], self._choice(record))
+                for record in self._store.for_user(user_id)
+            ]
+            self._by_user[user_id] = entries
+        return entries
+
+    def search(self, user_id: str, current: str, everyone: bool = False) -> List[app_commands.Choice]:
+        current = current.strip().lower()
+        choices = [
+            choice for container_id, choice in self.for_user(user_id)
+            if container_id.startswith(current) or current in choice.name.lower()
+        ]
+        if everyone:
+            # Admins also get everybody else's instances through the prefix index
+            own = {choice.value for choice in choices}
+            choices.extend(
+                self._choice(self._store.get(container_id))
+                for container_id in self._store.with_prefix(current, limit=25 + len(own))
+                if container_id not in own
+            )
+        return choices[:25]
+
+instance_choices = InstanceChoiceCache(db)
+
+def _instance_counts() -> Dict[tuple, int]:
+    counts: Dict[tuple, int] = {}
+    for records in db.by_user().values():
+        for record in records:
+            key = (record["status"], docker_hosts.host_of(record["container_id"]))
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+metrics.register(Gauge("nxh_instances", "Stored instances", ("status", "host"), _instance_counts))
+metrics.register(Gauge(
+    "nxh_user_instances", "Stored instances per user", ("user",),
+    lambda: {(user_id,): len(records) for user_id, records in db.by_user().items()}
+))
+
+async def container_id_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    # Admins can pick any instance, everyone else only their own
+    return instance_choices.search(
+        str(interaction.user.id),
+        current,
+        everyone=is_admin(interaction.user.id)
+    )
+
+# Docker helper functions
+def parse_container_stats(stats: Dict, online: bool) -> Dict:
+    cpu_percent = 0.0
+    memory_usage = 0
+    memory_limit = 0
+    
+    if 'cpu_stats' in stats and 'precpu_stats' in stats:
+        cpu_usage = stats['cpu_stats'].get('cpu_usage', {})
+        precpu_usage = stats['precpu_stats'].get('cpu_usage', {})
+        cpu_delta = cpu_usage.get('total_usage', 0) - precpu_usage.get('total_usage', 0)
+        system_delta = stats['cpu_stats'].get('system_cpu_usage', 0) - stats['precpu_stats'].get('system_cpu_usage', 0)
+        # percpu_usage is missing on cgroup v2 hosts
+        online_cpus = stats['cpu_stats'].get('online_cpus') or len(cpu_usage.get('percpu_usage') or []) or 1
+        
+        if system_delta > 0 and cpu_delta > 0:
+            cpu_percent = (cpu_delta / system_delta) * online_cpus * 100
+    
+    if 'memory_stats' in stats:
+        memory_usage = stats['memory_stats'].get('usage', 0)
+        memory_limit = stats['memory_stats'].get('limit', 1)
+    
+    networks = (stats.get('networks') or {}).values()
+    blkio = (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []
+    
+    return {
+        'timestamp': time.time(),
+        'cpu_percent': round(cpu_percent, 2),
+        'memory_usage': memory_usage,
+        'memory_limit': memory_limit,
+        'memory_percent': round((memory_usage / memory_limit) * 100, 2) if memory_limit else 0,
+        'net_rx': sum(net.get('rx_bytes', 0) for net in networks),
+        'net_tx': sum(net.get('tx_bytes', 0) for net in networks),
+        'block_read': sum(io.get('value', 0) for io in blkio if io.get('op', '').lower() == 'read'),
+        'block_write': sum(io.get('value', 0) for io in blkio if io.get('op', '').lower() == 'write'),
+        'online': online
+    }
+
+class StatsCache:
+    """Rolling per-container stats, refilled by one concurrent sweep over all managed containers.
+
+    Handlers read the latest sample in O(1) instead of paying for a live
+    ``container.stats`` round trip.
+    """
+
+    def __init__(self, history: int, concurrency: int):
+        self.history = history
+        self._samples: Dict[str, deque] = {}
+        self._concurrency = concurrency
+        self.total_containers: Optional[int] = None
+        self.running_containers: Optional[int] = None
+
+    def latest(self, container_id: str) -> Optional[Dict]:
+        samples = self._samples.get(container_id)
+        return samples[-1] if samples else None
+
+    def samples(self, container_id: str) -> List[Dict]:
+        return list(self._samples.get(container_id, ()))
+
+    def _record(self, container_id: str, sample: Dict):
+        self._samples.setdefault(container_id, deque(maxlen=self.history)).append(sample)
+
+    def mark_offline(self, container_id: str):
+        # So placement sees the memory as free before the next sweep
+        self._record(container_id, parse_container_stats({}, online=False))
+
+    async def sweep(self):
+        listing = await docker_hosts.list_containers(all=True, sparse=True)
+        containers = [container for host_containers in listing.values() for container in host_containers]
+        self.total_containers = len(containers)
+        self.running_containers = len([c for c in containers if c.status == 'running'])
+        
+        managed = [c for c in containers if db.get(c.id)]
+        semaphore = asyncio.Semaphore(self._concurrency)
+        apis = {c.id: docker_hosts.get(host_name).api for host_name, host_containers in listing.items() for c in host_containers}
+        
+        async def sample(container):
+            if container.status != 'running':
+                self._record(container.id, parse_container_stats({}, online=False))
+                return
+            async with semaphore:
+                try:
+                    stats = await apis[container.id].stats(container)
+                except docker.errors.DockerException as e:
+                    logger.error(f"Error getting stats for container {container.id}: {e}")
+                    return
+            self._record(container.id, parse_container_stats(stats, online=True))
+        
+        await asyncio.gather(*(sample(container) for container in managed))
+        
+        # Drop buffers for containers that are gone; unreachable hosts keep their last samples
+        managed_ids = {c.id for c in managed}
+        for container_id in list(self._samples):
+            if container_id not in managed_ids and docker_hosts.host_of(container_id) in listing:
+                del self._samples[container_id]
+
+stats_cache = StatsCache(STATS_HISTORY, STATS_CONCURRENCY)
+
+def get_container_stats(container_id: str) -> Optional[Dict]:
+    sample = stats_cache.latest(container_id)
+    CACHE_REQUESTS.inc(cache="stats", result="miss" if sample is None else "hit")
+    return sample
+
+# tmate sessions
+class TmateError(Exception):
+    pass
+
+class TmateSession:
+    """A long-lived ``tmate -F`` running inside one container."""
+
+    # Longest keys first so "ssh session read only:" never matches as "ssh session:"
+    URL_KEYS = (
+        ("ssh session read only:", "ssh_ro"),
+        ("web session read only:", "web_ro"),
+        ("ssh session:", "ssh"),
+        ("web session:", "web"),
+    )
+
+    def __init__(self, container_id: str, process):
+        self.container_id = container_id
+        self.process = process
+        self.pid: Optional[str] = None  # PID of tmate inside the container
+        self.ssh: Optional[str] = None
+        self.web: Optional[str] = None
+        self.ssh_ro: Optional[str] = None
+        self.web_ro: Optional[str] = None
+        self.clients = 0  # Clients attached right now, as far as tmate has told us
+        self._drain_task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def _readline(self) -> Optional[str]:
+        try:
+            line = await self.process.stdout.readline()
+        except ValueError:
+            # Line longer than the stream limit; skip it instead of buffering it
+            return ""
+        if not line:
+            return None
+        return line.decode('utf-8', errors='replace').strip()
+
+    def _parse(self, line: str):
+        for key, attribute in self.URL_KEYS:
+            if line.startswith(key) or f" {key}" in line:
+                setattr(self, attribute, line.split(key, 1)[1].strip())
+                return
+
+    async def capture(self, max_lines: int, grace: float):
+        """Reads tmate's banner until the SSH line shows up (plus a short grace for the URLs)."""
+        self.pid = await self._readline()
+        for _ in range(max_lines):
+            line = await self._readline()
+            if line is None:
+                return
+            self._parse(line)
+            if self.ssh:
+                break
+        
+        deadline = time.monotonic() + grace
+        while not (self.web and self.ssh_ro and self.web_ro):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                line = await asyncio.wait_for(self._readline(), remaining)
+            except asyncio.TimeoutError:
+                return
+            if line is None:
+                return
+            self._parse(line)
+
+    def _track_clients(self, line: str):
+        # tmate -F prints a notice whenever a client joins or leaves
+        match = re.search(r"(\d+) clients? currently connected", line)
+        if match:
+            self.clients = int(match.group(1))
+        elif "joined" in line:
+            self.clients += 1
+        elif "left" in line:
+            self.clients = max(0, self.clients - 1)
+
+    def start_draining(self):
+        # Keep reading so tmate never blocks on a full pipe; only client counts are kept
+        async def drain():
+            while (line := await self._readline()) is not None:
+                self._track_clients(line)
+            await self.process.wait()
+        self._drain_task = asyncio.create_task(drain())
+
+class TmateSessionManager:
+    """Owns at most one tmate process per container.
+
+    Sessions are reused while their process is alive, replaced on request, and
+    every capture has a hard deadline after which the process is killed.
+    """
+
+    def __init__(self, capture_timeout: float, max_lines: int, grace: float):
+        self.capture_timeout = capture_timeout
+        self.max_lines = max_lines
+        self.grace = grace
+        self._sessions: Dict[str, TmateSession] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get(self, container_id: str, fresh: bool = False) -> TmateSession:
+        lock = self._locks.setdefault(container_id, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(container_id)
+            if session and session.alive and not fresh:
+                return session
+            if session:
+                await self._terminate(session)
+            session = await self._open(container_id)
+            self._sessions[container_id] = session
+            return session
+
+    def peek(self, container_id: str) -> Optional[TmateSession]:
+        """The container's current session, without starting one."""
+        return self._sessions.get(container_id)
+
+    def discard(self, container_id: str):
+        """Forgets a container's session once the container is stopped or removed."""
+        self._locks.pop(container_id, None)
+        session = self._sessions.pop(container_id, None)
+        if session:
+            if session.alive:
+                session.process.kill()
+            if session._drain_task:
+                session._drain_task.cancel()
+
+    async def _open(self, container_id: str) -> TmateSession:
+        started = time.perf_counter()
+        session = TmateSession(container_id, await spawn_tmate(container_id))
+        try:
+            await asyncio.wait_for(session.capture(self.max_lines, self.grace), self.capture_timeout)
+        except asyncio.TimeoutError:
+            await self._terminate(session)
+            raise TmateError(f"tmate didn't start within {self.capture_timeout}s")
+        if not session.ssh:
+            await self._terminate(session)
+            raise TmateError("tmate exited without an SSH session")
+        session.start_draining()
+        logger.info(f"tmate session for {container_id[:12]} ready in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return session
+
+    async def _terminate(self, session: TmateSession):
+        if session.pid and session.pid.isdigit():
+            # Closing our end of the exec leaves tmate running inside the container.
+            # The shell's kill builtin, since slim images have no procps /bin/kill
+            try:
+                await docker_hosts.for_container(session.container_id).exec_run(session.container_id, ["sh", "-c", f"kill {session.pid}"])
+            except docker.errors.DockerException as e:
+                logger.error(f"Error stopping tmate in {session.container_id[:12]}: {e}")
+        if session.alive:
+            session.process.kill()
+        if session._drain_task:
+            session._drain_task.cancel()
+        try:
+            await asyncio.wait_for(session.process.wait(), 10)
+        except asyncio.TimeoutError:
+            logger.error(f"tmate process for {session.container_id[:12]} didn't exit")
+
+def add_tmate_link_fields(embed: discord.Embed, session: TmateSession):
+    links = []
+    if session.web:
+        links.append(f"🌐 Web: {session.web}")
+    if session.ssh_ro:
+        links.append(f"👀 Read-only SSH: `{session.ssh_ro}`")
+    if session.web_ro:
+        links.append(f"👀 Read-only web: {session.web_ro}")
+    if links:
+        embed.add_field(name="✨ More Ways In", value="\n".join(links), inline=False)
+
+tmate_sessions = TmateSessionManager(TMATE_CAPTURE_TIMEOUT, TMATE_MAX_BANNER_LINES, TMATE_URL_GRACE)
+
+class ExecStream:
+    """Async reader for a Docker exec socket, shaped like an asyncio subprocess.
+
+    Docker multiplexes stdout and stderr into 8-byte-header frames; both are
+    fed into ``stdout``. Plain (unix/tcp) sockets are read with the event loop's
+    ``sock_recv``; TLS and SSH transports get a reader thread of their own,
+    since a session can stay open for as long as its instance runs.
+    """
+
+    def __init__(self, container_id: str, exec_id: str, sock, limit: int, api: AsyncDocker):
+        self.container_id = container_id
+        self.exec_id = exec_id
+        self._api = api
+        self.returncode: Optional[int] = None
+        self.stdout = asyncio.StreamReader(limit=limit)
+        self.first_byte_at: Optional[float] = None
+        self._sock = sock
+        self._done = asyncio.Event()
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+        raw = getattr(self._sock, '_sock', self._sock)
+        native = isinstance(raw, socket.socket) and not isinstance(raw, ssl.SSLSocket)
+        if native:
+            raw.setblocking(False)
+            receive = functools.partial(loop.sock_recv, raw, 65536)
+        else:
+            # Never the default executor: its few workers would all end up parked here
+            chunks: asyncio.Queue = asyncio.Queue()
+            threading.Thread(
+                target=self._read_blocking, args=(raw, loop, chunks),
+                name=f"exec-{self.container_id[:12]}", daemon=True
+            ).start()
+            receive = chunks.get
+        buffer = b''
+        try:
+            while True:
+                chunk = await receive()
+                if not chunk:
+                    break
+                if self.first_byte_at is None:
+                    self.first_byte_at = time.perf_counter()
+                buffer += chunk
+                while len(buffer) >= 8:
+                    size = int.from_bytes(buffer[4:8], 'big')
+                    if len(buffer) < 8 + size:
+                        break
+                    self.stdout.feed_data(buffer[8:8 + size])
+                    buffer = buffer[8 + size:]
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.stdout.feed_eof()
+            self._close_socket()
+            self.returncode = await self._exit_code()
+            self._done.set()
+
+    @staticmethod
+    def _read_blocking(raw, loop: asyncio.AbstractEventLoop, chunks: asyncio.Queue):
+        # Runs on the stream's own thread; an empty chunk tells the pump it's over
+        while True:
+            try:
+                chunk = raw.recv(65536)
+            except Exception:
+                chunk = b''
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except RuntimeError:
+                return  # The event loop is closed
+            if not chunk:
+                return
+
+    async def _exit_code(self) -> int:
+        try:
+            info = await self._api.exec_inspect(self.exec_id)
+            return info.get('ExitCode') if info.get('ExitCode') is not None else -1
+        except docker.errors.DockerException:
+            return -1
+
+    def _close_socket(self):
+        raw = getattr(self._sock, '_sock', self._sock)
+        try:
+            # Closing alone doesn't reliably wake a reader thread blocked in recv()
+            raw.shutdown(socket.SHUT_RDWR)
+        except (OSError, AttributeError):
+            pass
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+    def kill(self):
+        # Only drops our end; tmate itself is stopped with a separate exec
+        self._pump_task.cancel()
+
+    async def wait(self) -> int:
+        await self._done.wait()
+        return self.returncode
+
+async def spawn_tmate(container_id: str) -> ExecStream:
+    # The shell prints tmate's PID first so the session can be stopped later
+    started = time.perf_counter()
+    api = docker_hosts.for_container(container_id)
+    exec_id = await api.exec_create(container_id, ["sh", "-c", "echo $$; exec tmate -F"])
+    sock = await api.exec_start_socket(exec_id)
+    stream = ExecStream(container_id, exec_id, sock, TMATE_MAX_LINE_BYTES, api)
+    logger.info(f"tmate exec attached to {container_id[:12]} in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return stream
+
+# Every container the bot creates carries these, so Docker alone can tell whose it is
+MANAGED_LABEL = "nxh-i7.managed"  # Value is bot_instance_id
+OWNER_LABEL = "nxh-i7.owner"  # Empty on warm containers; they're renamed when handed out instead
+IMAGE_LABEL = "nxh-i7.image"
+PROFILE_LABEL = "nxh-i7.profile"
+CREATED_LABEL = "nxh-i7.created"
+OWNED_NAME_PREFIX = "nxh-i7-"  # nxh-i7-<user id>-<short container id>
+
+def managed_filter(*labels: str) -> Dict:
+    """list_containers() filter for this bot's containers, optionally narrowed by more labels."""
+    return {"label": [f"{MANAGED_LABEL}={bot_instance_id}", *labels]}
+
+def instance_labels(user_id: str, image_name: str, profile_name: str) -> Dict[str, str]:
+    return {
+        OWNER_LABEL: str(user_id),
+        IMAGE_LABEL: image_name,
+        PROFILE_LABEL: profile_name,
+        CREATED_LABEL: datetime.datetime.now().isoformat(),
+    }
+
+def owned_name(user_id: str, container_id: str) -> str:
+    return f"{OWNED_NAME_PREFIX}{user_id}-{container_id[:12]}"
+
+def container_owner(container) -> Optional[str]:
+    """Owner of a sparsely listed container: its label, or the name it got when taken from the warm pool."""
+    owner = (container.attrs.get("Labels") or {}).get(OWNER_LABEL)
+    if owner:
+        return owner
+    for name in container.attrs.get("Names") or []:
+        match = re.fullmatch(rf"/?{re.escape(OWNED_NAME_PREFIX)}(\d+)-[0-9a-f]+", name)
+        if match:
+            return match.group(1)
+    return None
+
+# Image pre-pull
+class ImagePull:
+    """One in-flight pull of an image onto a host."""
+
+    def __init__(self, image: str, host_name: str):
+        self.image = image
+        self.host_name = host_name
+        self.layers: Dict[str, tuple] = {}  # Layer ID -> (bytes done, bytes total); written by the worker thread
+        self.task: Optional[asyncio.Task] = None
+
+    def on_event(self, event: Dict):
+        layer = event.get("id")
+        detail = event.get("progressDetail") or {}
+        if event.get("status") == "Downloading" and detail.get("total"):
+            self.layers[layer] = (detail.get("current", 0), detail["total"])
+        elif event.get("status") in ("Download complete", "Pull complete") and layer in self.layers:
+            total = self.layers[layer][1]
+            self.layers[layer] = (total, total)
+
+    def progress(self) -> Optional[tuple]:
+        """(bytes done, bytes total) over the layers whose size is known so far."""
+        layers = list(self.layers.values())
+        if not layers:
+            return None
+        return sum(done for done, _ in layers), sum(total for _, total in layers)
+
+class ImagePuller:
+    """Pulls DOCKER_IMAGES onto every host ahead of deploys.
+
+    There's at most one pull per image and host: a deploy that needs an image
+    that's being pulled waits on that pull instead of starting another. With
+    REGISTRY_MIRROR set, images come from the mirror if it has them and are
+    tagged with their usual name.
+    """
+
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pulls: Dict[tuple, ImagePull] = {}
+        self._background: set = set()
+        self._local_only: set = set()  # (host, image) pairs no registry has; warned about once
+
+    def configure(self, concurrency: int):
+        # Pulls already waiting keep the old limit
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def pull(self, image: str, host_name: str) -> ImagePull:
+        """The running pull of ``image`` onto ``host_name``, started if there's none."""
+        key = (host_name, image)
+        pull = self._pulls.get(key)
+        if pull is None:
+            pull = ImagePull(image, host_name)
+            pull.task = asyncio.create_task(self._run(pull))
+            pull.task.add_done_callback(lambda _: self._pulls.pop(key, None))
+            self._pulls[key] = pull
+        return pull
+
+    async def ensure(self, image: str, host_name: str, on_progress=None):
+        """Returns once ``image`` is on ``host_name``, joining or starting a pull if it isn't.
+
+        ``on_progress(pull)`` is called about once a second while waiting.
+        """
+        try:
+            await docker_hosts.get(host_name).api.get_image(image)
+            CACHE_REQUESTS.inc(cache="image", result="hit")
+            return
+        except docker.errors.ImageNotFound:
+            CACHE_REQUESTS.inc(cache="image", result="miss")
+        pull = self.pull(image, host_name)
+        # asyncio.wait never cancels the pull, so other waiters keep it if this one gives up
+        while not pull.task.done():
+            if on_progress:
+                on_progress(pull)
+            await asyncio.wait({pull.task}, timeout=1)
+        pull.task.result()
+
+    async def _run(self, pull: ImagePull):
+        api = docker_hosts.get(pull.host_name).api
+        repository, tag = docker.utils.parse_repository_tag(pull.image)
+        tag = tag or "latest"
+        async with self._semaphore:
+            started = time.perf_counter()
+            source = "its registry"
+            if REGISTRY_MIRROR:
+                mirrored = f"{REGISTRY_MIRROR}/{repository}"
+                try:
+                    await api.pull_image(mirrored, tag, pull.on_event)
+                    await api.tag_image(f"{mirrored}:{tag}", repository, tag)
+                    source = REGISTRY_MIRROR
+                except docker.errors.DockerException as e:
+                    logger.warning(f"Registry mirror could not provide {pull.image} ({e}), pulling it from its registry")
+                    pull.layers.clear()
+            if source != REGISTRY_MIRROR:
+                await api.pull_image(repository, tag, pull.on_event)
+        logger.info(f"Pulled {pull.image} onto {pull.host_name} from {source} in {time.perf_counter() - started:.1f}s")
+
+    async def pull_all(self, refresh: bool):
+        """Pulls every image onto every reachable host; ``refresh`` re-pulls ones already there to pick up updates."""
+        async def pull_one(image: str, host: DockerHost):
+            try:
+                if refresh:
+                    await asyncio.shield(self.pull(image, host.name).task)
+                else:
+                    await self.ensure(image, host.name)
+                self._local_only.discard((host.name, image))
+            except docker.errors.DockerException as e:
+                try:
+                    await host.api.get_image(image)
+                except docker.errors.DockerException:
+                    logger.error(f"Could not pull {image} onto {host.name}: {e}")
+                    return
+                # Built on the host rather than pushed anywhere; the local copy is all there is
+                if (host.name, image) not in self._local_only:
+                    self._local_only.add((host.name, image))
+                    logger.info(f"Could not refresh {image} on {host.name}, keeping its local copy: {e}")
+        
+        hosts = [host for host in docker_hosts.hosts.values() if host.reachable and not host.draining]
+        images = {image_data['name'] for image_data in DOCKER_IMAGES.values()}
+        await asyncio.gather(*(pull_one(image, host) for host in hosts for image in images))
+
+    def pull_all_soon(self):
+        """Fetches images that aren't on a host yet in the background (after a config change added some)."""
+        task = asyncio.create_task(self.pull_all(refresh=False))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+image_puller = ImagePuller(IMAGE_PULL_CONCURRENCY)
+metrics.register(Gauge("nxh_image_pulls_in_flight", "Image pulls running or waiting", (), lambda: {(): len(image_puller._pulls)}))
+
+@tasks.loop(seconds=IMAGE_PULL_INTERVAL)
+async def prepull_images():
+    try:
+        await image_puller.pull_all(refresh=True)
+    except Exception as e:
+        logger.error(f"Image pre-pull failed: {e}")
+
+@prepull_images.before_loop
+async def before_prepull_images():
+    # Hosts count as unreachable until they've been refreshed once
+    await docker_hosts.refresh()
+
+def describe_pull(pull: ImagePull) -> str:
+    progress = pull.progress()
+    if not progress:
+        return ""
+    done, total = progress
+    return f" {done * 100 // total}% ({done / 1024 ** 2:.0f}MB / {total / 1024 ** 2:.0f}MB)"
+
+async def benchmark_images(images: List[str], runs: int = 3, settle: float = 10):
+    """Size, cold start-to-SSH-line latency and idle memory per image, on the default Docker host.
+
+    Each run starts a fresh container and opens tmate exactly like a deploy
+    does; idle memory is the container's anonymous memory (RSS) ``settle``
+    seconds after the SSH line appeared. Reported values are medians.
+    """
+    import statistics
+    host = docker_hosts.get(docker_hosts.default)
+    print(f"{'image':<40}{'size (MB)':>11}{'to SSH (s)':>12}{'idle RSS (MB)':>15}")
+    for image in images:
+        size = (await host.api.get_image(image)).attrs["Size"]
+        latencies, rss = [], []
+        for _ in range(runs):
+            started = time.perf_counter()
+            container = await host.api.run_container(image, detach=True, tty=True)
+            docker_hosts.track(container.id, host.name)
+            try:
+                await tmate_sessions.get(container.id)
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(settle)
+                memory = (await host.api.stats(container)).get("memory_stats", {})
+                counters = memory.get("stats", {})
+                # cgroup v2 reports "anon", v1 "rss"; usage alone includes page cache
+                rss.append(counters.get("anon", counters.get("rss", memory.get("usage", 0))))
+            finally:
+                tmate_sessions.discard(container.id)
+                await host.api.remove(container, force=True)
+                docker_hosts.forget(container.id)
+        print(
+            f"{image:<40}{size / 1024 ** 2:>11.1f}{statistics.median(latencies):>12.2f}"
+            f"{statistics.median(rss) / 1024 ** 2:>15.1f}"
+        )
+
+def container_resources(profile: Dict) -> Dict:
+    """containers.run() limits for a resource profile."""
+    resources = {
+        "nano_cpus": int(profile["cpus"] * 1e9),
+        "mem_limit": profile["memory"],
+        "memswap_limit": profile["memory_swap"],
+        "pids_limit": profile["pids"],
+        "cpu_shares": profile["cpu_shares"],
+        "blkio_weight": profile["blkio_weight"],
+        "ulimits": [docker.types.Ulimit(name="nofile", soft=profile["nofile"], hard=profile["nofile"])],
+    }
+    if profile["disk"]:
+        resources["storage_opt"] = {"size": profile["disk"]}
+    return resources
+
+async def run_instance_container(image_data: Dict, profile: Dict, host_name: str, labels: Optional[Dict[str, str]] = None):
+    container = await docker_hosts.get(host_name).api.run_container(
+        image_data['name'],
+        detach=True,
+        tty=True,
+        restart_policy={"Name": "on-failure", "MaximumRetryCount": 3},
+        labels={MANAGED_LABEL: bot_instance_id, **(labels or {})},
+        **container_resources(profile)
+    )
+    # Until it's stored, this is how lifecycle calls find the container's host
+    docker_hosts.track(container.id, host_name)
+    return container
+
+# Warm pool
+WARM_POOL_LABEL = "nxh-i7.warm-pool"
 
-# Available Docker images with metadata
-DOCKER_IMAGES = {
-    "ubuntu-22.04": {
-        "name": "ubuntu-22.04-with-tmate",
-        "display_name": "Ubuntu 22.04 🌸",
-        "description": "Adorable Ubuntu 22.04 with tmate pre-installed ✨",
-        "ram": "6GB",
-        "cpu": "2 cores"
-    },
-}
+class WarmInstance:
+    def __init__(self, image_name: str, container, session: TmateSession, host_name: str, memory: int):
+        self.image_name = image_name
+        self.container = container
+        self.session = session
+        self.host_name = host_name
+        self.memory = memory  # Reserved on the host until the instance is handed out or removed
 
-# Cute pastel color palette
-COLORS = {
-    'pink': 0xFFB3E6,      # Soft pink
-    'purple': 0xC8A8E9,    # Lavender
-    'blue': 0xB3D9FF,      # Baby blue
-    'green': 0xB3FFB3,     # Mint green
-    'yellow': 0xFFE0B3,    # Peach
-    'red': 0xFFB3B3,       # Rose pink
-    'success': 0xC8E6C9,   # Light green
-    'error': 0xFFCDD2,     # Light red
-    'info': 0xE1F5FE,      # Light blue
-}
+    @property
+    def alive(self) -> bool:
+        return self.session.alive
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+class WarmPool:
+    """Pre-started containers per image, handed out instantly by create_server_task.
 
-intents = discord.Intents.default()
-intents.messages = True
-intents.message_content = True
+    Refills run in the background up to WARM_POOL_SIZES, but only while some
+    Docker host has CPU and memory headroom for another instance.
+    """
 
-bot = commands.Bot(command_prefix='/', intents=intents)
-client = docker.from_env()
+    def __init__(self, sizes: Dict[str, int]):
+        self.sizes = sizes
+        self._ready: Dict[str, List[WarmInstance]] = {image_name: [] for image_name in sizes}
+        self._dead: List[WarmInstance] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
 
-# Channel restriction check
-def check_allowed_channel(interaction: discord.Interaction) -> bool:
-    return interaction.channel_id == ALLOWED_CHANNEL_ID
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
 
-class ImageSelectView(View):
-    def __init__(self, user_id: int):
-        super().__init__(timeout=60)
-        self.user_id = user_id
-        self.selected_image = None
-        
-        # Create a dropdown for image selection
-        select = Select(
-            placeholder="Choose your perfect OS image~ 🌸",
-            options=[
-                discord.SelectOption(
-                    label=img["display_name"],
-                    description=img["description"],
-                    value=img_name,
-                    emoji="💖"
-                ) for img_name, img in DOCKER_IMAGES.items()
-            ]
-        )
-        select.callback = self.select_callback
-        self.add_item(select)
-        
-        # Add deploy button
-        deploy_button = Button(label="Deploy My Instance!", style=discord.ButtonStyle.green, emoji="✨")
-        deploy_button.callback = self.deploy_callback
-        self.add_item(deploy_button)
-    
-    async def select_callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("💔 This isn't your deployment, sweetie!", ephemeral=True)
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    def take(self, image_name: str) -> Optional[WarmInstance]:
+        # No awaits between checking and popping, so two deploys never get the same instance
+        ready = self._ready.get(image_name, [])
+        while ready:
+            instance = ready.pop(0)
+            if instance.alive:
+                # From here on it's a stored instance, covered by the stats sweep
+                docker_hosts.release(instance.host_name, instance.memory)
+                self._wakeup.set()
+                return instance
+            self._dead.append(instance)
+        self._wakeup.set()
+        return None
+
+    def ready_count(self, image_name: str) -> int:
+        return len(self._ready.get(image_name, []))
+
+    def ready_on(self, host_name: str) -> List[str]:
+        """IDs of the ready instances on a host, none of which has been handed out."""
+        return [
+            instance.container.id
+            for ready in self._ready.values() for instance in ready
+            if instance.host_name == host_name and instance.alive
+        ]
+
+    def wake(self):
+        # Capacity was freed; refill now instead of at the next interval
+        self._wakeup.set()
+
+    def resize(self, sizes: Dict[str, int]):
+        # Instances beyond the new targets are removed on the next refill
+        self.sizes = sizes
+        for image_name, ready in self._ready.items():
+            surplus = len(ready) - sizes.get(image_name, 0)
+            if surplus > 0:
+                self._dead.extend(ready[-surplus:])
+                del ready[-surplus:]
+        self._wakeup.set()
+
+    async def _run(self):
+        await self._remove_leftovers()
+        while True:
+            try:
+                await self._refill()
+            except Exception as e:
+                logger.error(f"Warm pool refill failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), WARM_POOL_REFILL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _remove_leftovers(self):
+        # Warm containers from a previous run were never handed out, so they're safe to drop
+        listing = await docker_hosts.list_containers(all=True, sparse=True, filters=managed_filter(WARM_POOL_LABEL))
+        for host_name, containers in listing.items():
+            for container in containers:
+                # Handed-out ones keep the warm label; an owner means it's someone's instance
+                if db.get(container.id) or container_owner(container):
+                    continue
+                docker_hosts.track(container.id, host_name)
+                await self._remove_container(container)
+
+    async def _refill(self):
+        for image_name, ready in self._ready.items():
+            self._dead.extend(instance for instance in ready if not instance.alive)
+            ready[:] = [instance for instance in ready if instance.alive]
+        while self._dead:
+            instance = self._dead.pop()
+            docker_hosts.release(instance.host_name, instance.memory)
+            await self._remove_container(instance.container)
+
+        for image_name, target in self.sizes.items():
+            ready = self._ready.setdefault(image_name, [])
+            # Warm instances always run the image's default profile
+            profile = RESOURCE_PROFILES[DOCKER_IMAGES[image_name]['profiles'][0]]
+
+            while len(ready) < target:
+                host_name = docker_hosts.place(profile, WARM_POOL_MIN_FREE_MEMORY, WARM_POOL_MAX_CPU_PERCENT)
+                if not host_name:
+                    logger.info("Warm pool refill paused: no Docker host has enough headroom")
+                    return
+                instance = await self._provision(image_name, profile, host_name)
+                if not instance:
+                    break
+                ready.append(instance)
+                logger.info(f"Warm pool: {image_name} now has {len(ready)}/{target} ready")
+
+    async def _provision(self, image_name: str, profile: Dict, host_name: str) -> Optional[WarmInstance]:
+        image_data = DOCKER_IMAGES[image_name]
+        container = None
+        try:
+            await image_puller.ensure(image_data['name'], host_name)
+            labels = {**instance_labels("", image_name, DOCKER_IMAGES[image_name]['profiles'][0]), WARM_POOL_LABEL: image_name}
+            container = await run_instance_container(image_data, profile, host_name, labels=labels)
+            session = await tmate_sessions.get(container.id)
+            docker_hosts.reserve(host_name, profile['memory'])
+            return WarmInstance(image_name, container, session, host_name, profile['memory'])
+        except Exception as e:
+            logger.error(f"Error pre-starting {image_name} instance: {e}")
+            if container is not None:
+                await self._remove_container(container)
+            return None
+
+    async def _remove_container(self, container):
+        tmate_sessions.discard(container.id)
+        try:
+            await docker_hosts.for_container(container.id).remove(container, force=True)
+        except docker.errors.DockerException as e:
+            logger.error(f"Error removing warm container {container.id[:12]}: {e}")
+        docker_hosts.forget(container.id)
+
+warm_pool = WarmPool(WARM_POOL_SIZES)
+metrics.register(Gauge(
+    "nxh_warm_pool_ready", "Warm instances ready to hand out", ("image",),
+    lambda: {(image_name,): warm_pool.ready_count(image_name) for image_name in DOCKER_IMAGES}
+))
+
+# Reconciliation
+class Reconciler:
+    """Keeps instance statuses in the store in sync with what Docker is actually doing.
+
+    A daemon thread per Docker host follows its events stream and applies container
+    start/die/oom/destroy events as they happen; ``reconcile_all`` is the
+    periodic full diff that catches anything the stream missed.
+    """
+
+    EVENT_STATUS = {
+        "start": "running",
+        "unpause": "running",
+        "die": "stopped",
+        "pause": "paused",
+    }
+    DOCKER_STATUS = {
+        "running": "running",
+        "paused": "paused",
+        "restarting": "restarting",
+        "created": "stopped",
+        "exited": "stopped",
+        "dead": "stopped",
+    }
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._threads: Dict[str, threading.Thread] = {}
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Follows every host that isn't followed yet; call again after hosts are added."""
+        self._loop = loop or self._loop
+        if self._loop is None:
+            return
+        for host in docker_hosts.hosts.values():
+            thread = self._threads.get(host.name)
+            if thread and thread.is_alive():
+                continue
+            thread = threading.Thread(target=self._follow_events, args=(host,), name=f"docker-events-{host.name}", daemon=True)
+            self._threads[host.name] = thread
+            thread.start()
+
+    def _follow_events(self, host: DockerHost):
+        last_event_time = None
+        while True:
+            try:
+                # Resume from the last event seen so a reconnect doesn't lose any
+                events = host.api.client.events(
+                    decode=True,
+                    filters={"type": "container"},
+                    since=last_event_time
+                )
+                for event in events:
+                    last_event_time = event.get("time", last_event_time)
+                    self._loop.call_soon_threadsafe(self.apply_event, event)
+            except Exception as e:
+                logger.error(f"Docker events stream for host {host.name} failed: {e}")
+            time.sleep(5)
+
+    def apply_event(self, event: Dict):
+        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+        action = event.get("Action") or event.get("status")
+        if not container_id or not db.get(container_id):
             return
-            
-        self.selected_image = interaction.data['values'][0]
-        img_data = DOCKER_IMAGES[self.selected_image]
         
-        embed = discord.Embed(
-            title="🌟 Perfect Choice!",
-            description=f"**{img_data['display_name']}** is ready to deploy~ 💖",
-            color=COLORS['success']
-        )
-        embed.add_field(name="✨ Description", value=img_data["description"], inline=False)
-        embed.add_field(name="🎀 Resources", value=f"{img_data['ram']} RAM | {img_data['cpu']} CPU", inline=False)
+        if action == "destroy":
+            logger.info(f"Instance {container_id[:12]} was removed outside the bot")
+            tmate_sessions.discard(container_id)
+            remove_from_database(container_id)
+        elif action == "oom":
+            logger.warning(f"Instance {container_id[:12]} ran out of memory")
+        elif action in self.EVENT_STATUS:
+            status = self.EVENT_STATUS[action]
+            if status != "running":
+                tmate_sessions.discard(container_id)
+            else:
+                # Started outside /start, so it's not hibernating anymore
+                update_container_hibernation(container_id, None)
+            update_container_status(container_id, status)
+
+    async def reconcile_all(self):
+        # Instances added while the list call is in flight aren't in its result
+        known_before = {record["container_id"] for records in db.by_user().values() for record in records}
+        listing = await docker_hosts.list_containers(all=True, sparse=True)
+        docker_status = {
+            c.id: self.DOCKER_STATUS.get(c.status, "stopped")
+            for containers in listing.values() for c in containers
+        }
         
-        await interaction.response.edit_message(embed=embed, view=self)
-    
-    async def deploy_callback(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("💔 This isn't your deployment, sweetie!", ephemeral=True)
-            return
-            
-        if not self.selected_image:
-            await interaction.response.send_message("🥺 Please select an image first, cutie!", ephemeral=True)
-            return
-            
-        await interaction.response.defer()
-        await create_server_task(interaction, self.selected_image)
-        self.stop()
+        removed = updated = 0
+        for user_id, records in db.by_user().items():
+            for record in records:
+                container_id = record["container_id"]
+                # An unreachable host says nothing about whether its instances still exist
+                if container_id not in known_before or docker_hosts.host_of(container_id) not in listing:
+                    continue
+                if container_id not in docker_status:
+                    tmate_sessions.discard(container_id)
+                    remove_from_database(container_id)
+                    removed += 1
+                elif record["status"] != docker_status[container_id]:
+                    update_container_status(container_id, docker_status[container_id])
+                    updated += 1
+        if removed or updated:
+            logger.info(f"Reconciled store with Docker: {updated} statuses fixed, {removed} missing instances dropped")
+        return updated, removed
 
-# Database functions
-def load_database() -> Dict:
-    if not os.path.exists(DATABASE_FILE):
-        return {}
-    
-    with open(DATABASE_FILE, 'r') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+reconciler = Reconciler()
 
-def save_database(data: Dict):
-    with open(DATABASE_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+@tasks.loop(seconds=DOCKER_HOST_REFRESH_INTERVAL)
+async def refresh_docker_hosts():
+    try:
+        await docker_hosts.refresh()
+    except Exception as e:
+        logger.error(f"Docker host refresh failed: {e}")
 
-def add_to_database(user_id: str, container_id: str, ssh_command: str, image_name: str):
-    data = load_database()
-    
-    if user_id not in data:
-        data[user_id] = []
-    
-    data[user_id].append({
-        "container_id": container_id,
-        "ssh_command": ssh_command,
-        "image": image_name,
-        "created_at": datetime.datetime.now().isoformat(),
-        "status": "running"
-    })
-    
-    save_database(data)
+@tasks.loop(seconds=RECONCILE_INTERVAL)
+async def reconcile_containers():
+    try:
+        await reconciler.reconcile_all()
+    except Exception as e:
+        logger.error(f"Full reconciliation failed: {e}")
 
-def remove_from_database(container_id: str):
-    data = load_database()
-    
-    for user_id, containers in data.items():
-        data[user_id] = [c for c in containers if c["container_id"] != container_id]
-    
-    save_database(data)
+# Index recovery
+async def recover_index(write: bool) -> Dict:
+    """Checks the store against this bot's labelled containers, with one filtered list call per host.
 
-def update_container_status(container_id: str, status: str):
-    data = load_database()
-    
-    for user_id, containers in data.items():
+    With ``write`` it also adds instances the store lost and fixes wrong
+    statuses and hosts. Stored instances without a labelled container are
+    only reported: they predate the labels or are gone, and the reconciler
+    drops the latter. Warm containers nobody owns yet are skipped.
+    """
+    listing = await docker_hosts.list_containers(all=True, sparse=True, filters=managed_filter())
+    report = {"containers": 0, "missing": 0, "fixed": 0, "unlabelled": 0}
+    labelled = set()
+    for host_name, containers in listing.items():
         for container in containers:
-            if container["container_id"] == container_id:
-                container["status"] = status
+            owner = container_owner(container)
+            if not owner:
+                continue
+            labels = container.attrs.get("Labels") or {}
+            status = Reconciler.DOCKER_STATUS.get(container.status, "stopped")
+            labelled.add(container.id)
+            report["containers"] += 1
+            
+            record = db.get(container.id)
+            if record is None:
+                report["missing"] += 1
+                logger.warning(f"Instance {container.id[:12]} of user {owner} on {host_name} is missing from the store")
+                if write:
+                    # The SSH session died with the old index; /regen-ssh makes a new one
+                    db.add({
+                        "container_id": container.id,
+                        "user_id": owner,
+                        "image": labels.get(IMAGE_LABEL),
+                        "created_at": labels.get(CREATED_LABEL) or datetime.datetime.fromtimestamp(container.attrs.get("Created", 0)).isoformat(),
+                        "status": status,
+                        "profile": labels.get(PROFILE_LABEL),
+                        "host": host_name,
+                    })
+            elif record["status"] != status or docker_hosts.host_of(container.id) != host_name:
+                report["fixed"] += 1
+                logger.warning(
+                    f"Instance {container.id[:12]} is stored as {record['status']} on {docker_hosts.host_of(container.id)}, "
+                    f"but Docker has it {status} on {host_name}"
+                )
+                if write:
+                    db.update(container.id, status=status, host=host_name)
     
-    save_database(data)
+    for records in db.by_user().values():
+        for record in records:
+            if record["container_id"] not in labelled and docker_hosts.host_of(record["container_id"]) in listing:
+                report["unlabelled"] += 1
+    
+    action = "Rebuilt" if write else "Verified"
+    logger.info(
+        f"{action} the instance index from {report['containers']} labelled containers: "
+        f"{report['missing']} missing, {report['fixed']} out of date, {report['unlabelled']} stored without a labelled container"
+    )
+    return report
 
-from typing import List, Dict
+# Idle hibernation
+class IdleMonitor:
+    """Stops running instances nobody has used for IDLE_TIMEOUT seconds.
 
-def get_user_containers(user_id: str) -> List[Dict]:
-    data = load_database()
-    return data.get(str(user_id), [])
+    An instance counts as active while a tmate client is attached, or when its
+    latest stats samples show CPU or network use above the IDLE_* thresholds.
+    Only instances whose tmate session we're watching can go idle: without one
+    (after a restart, or once the exec drops) attached clients are invisible,
+    so the instance keeps running until /start, /restart or /regen-ssh opens one.
+    Hibernated instances are plain stopped containers with ``hibernated_at``
+    set, so their memory goes back to the host and /start resumes them as-is.
+    """
 
-def count_user_containers(user_id: str) -> int:
-    return len(get_user_containers(user_id))
+    def __init__(self):
+        self._last_active: Dict[str, float] = {}
 
-def get_container_info(container_id: str) -> Optional[Dict]:
-    data = load_database()
-    
-    for user_id, containers in data.items():
-        for container in containers:
-            if container["container_id"] == container_id:
-                container["user_id"] = user_id  # Add user_id to container info
-                return container
-    return None
+    def _is_active(self, container_id: str) -> bool:
+        session = tmate_sessions.peek(container_id)
+        if session is None or not session.alive or session.clients:
+            return True
+        samples = stats_cache.samples(container_id)[-2:]
+        if not samples or not samples[-1]['online']:
+            return False
+        if samples[-1]['cpu_percent'] >= IDLE_CPU_PERCENT:
+            return True
+        if len(samples) == 2 and samples[0]['online']:
+            traffic = (samples[1]['net_rx'] + samples[1]['net_tx']) - (samples[0]['net_rx'] + samples[0]['net_tx'])
+            return traffic >= IDLE_NET_BYTES
+        return False
 
-# Docker helper functions
-async def get_container_stats(container_id: str) -> Dict:
+    def observe(self):
+        """Updates activity from the stats just sampled; run after every sweep."""
+        now = time.time()
+        running = {record["container_id"] for record in db.with_status("running")}
+        for container_id in list(self._last_active):
+            if container_id not in running:
+                del self._last_active[container_id]
+        for container_id in running:
+            # Instances seen for the first time (or just resumed) get a full timeout
+            if container_id not in self._last_active or self._is_active(container_id):
+                self._last_active[container_id] = now
+
+    def idle_instances(self) -> List[str]:
+        if not IDLE_TIMEOUT:
+            return []
+        cutoff = time.time() - IDLE_TIMEOUT
+        return [container_id for container_id, last_active in self._last_active.items() if last_active <= cutoff]
+
+    async def hibernate(self, container_id: str):
+        api = docker_hosts.for_container(container_id)
+        container = await api.get_container(container_id)
+        await api.stop(container)
+        tmate_sessions.discard(container_id)
+        update_container_status(container_id, "stopped")
+        update_container_hibernation(container_id, datetime.datetime.now().isoformat())
+        stats_cache.mark_offline(container_id)
+        self._last_active.pop(container_id, None)
+        # The freed memory can take a queued deployment or a warm instance right away
+        deploy_scheduler.wake()
+        warm_pool.wake()
+        logger.info(f"Hibernated idle instance {container_id[:12]}")
+
+    async def hibernate_idle(self):
+        for container_id in self.idle_instances():
+            record = db.get(container_id)
+            if not record:
+                self._last_active.pop(container_id, None)
+                continue
+            # A session opened or a client joined since the last sweep
+            if self._is_active(container_id):
+                self._last_active[container_id] = time.time()
+                continue
+            try:
+                await self.hibernate(container_id)
+            except docker.errors.DockerException as e:
+                logger.error(f"Error hibernating instance {container_id[:12]}: {e}")
+                continue
+            
+            embed = discord.Embed(
+                title="💤 Your Instance Is Taking a Nap",
+                description=f"`{container_id[:12]}` wasn't used for a while, so it's resting to save energy~ 🌙",
+                color=COLORS['purple']
+            )
+            embed.add_field(
+                name="⏰ Wake It Up",
+                value=f"Use `/start {container_id[:12]}` and everything will be right where you left it! 💖",
+                inline=False
+            )
+            try:
+                user = await bot.fetch_user(int(record["user_id"]))
+                await user.send(embed=embed)
+            except (discord.HTTPException, ValueError):
+                logger.warning(f"Could not send DM to user {record['user_id']}")
+
+idle_monitor = IdleMonitor()
+
+@tasks.loop(seconds=IDLE_CHECK_INTERVAL)
+async def hibernate_idle_instances():
     try:
-        container = client.containers.get(container_id)
-        stats = container.stats(stream=False)
-        
-        cpu_percent = 0.0
-        memory_usage = 0
-        memory_limit = 0
-        
-        if 'cpu_stats' in stats and 'precpu_stats' in stats:
-            cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-            system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
+        await idle_monitor.hibernate_idle()
+    except Exception as e:
+        logger.error(f"Idle check failed: {e}")
+
+# Garbage collection
+def container_age(container) -> float:
+    # Listed containers report Created as a unix time, inspected ones as an ISO string
+    created = container.attrs.get("Created")
+    if isinstance(created, (int, float)):
+        return time.time() - created
+    created_at = datetime.datetime.fromisoformat(created[:19]).replace(tzinfo=datetime.timezone.utc)
+    return time.time() - created_at.timestamp()
+
+class GarbageCollector:
+    """Removes expired instances, leaked containers and stale store rows, and prunes images and volumes.
+
+    Leaked containers are ones carrying MANAGED_LABEL that are neither stored
+    nor tracked (warm or mid-deploy) once GC_ORPHAN_GRACE has passed. One with
+    an owner is only removed if its deploy failed in this run: otherwise it's
+    a user's instance the store lost, which is reported and kept. Pruning
+    is the expensive part, so the periodic pass does it at most once a day,
+    inside GC_PRUNE_HOURS, one host at a time.
+    """
+
+    def __init__(self):
+        self.last_report: Optional[Dict] = None
+        self.failed_deploys: set = set()  # Owned containers whose deploy failed and couldn't be removed
+        self._last_prune_date: Optional[datetime.date] = None
+        self._lock = asyncio.Lock()
+
+    def prune_due(self) -> bool:
+        now = datetime.datetime.now()
+        start, end = GC_PRUNE_HOURS
+        if start <= end:
+            in_window = start <= now.hour < end
+        else:
+            in_window = now.hour >= start or now.hour < end  # Window across midnight
+        return in_window and self._last_prune_date != now.date()
+
+    async def run(self, prune: bool) -> Dict:
+        async with self._lock:
+            started = time.perf_counter()
+            report = {
+                "expired": 0,
+                "orphans": 0,
+                "stale_rows": 0,
+                "images": 0,
+                "volumes": 0,
+                "space_reclaimed": 0,
+            }
+            await self._remove_expired(report)
+            await self._remove_orphans(report)
+            _, report["stale_rows"] = await reconciler.reconcile_all()
+            if prune:
+                await self._prune(report)
+                self._last_prune_date = datetime.date.today()
+            
+            report["duration"] = time.perf_counter() - started
+            report["finished_at"] = datetime.datetime.now().isoformat()
+            self.last_report = report
+            logger.info(
+                f"GC pass: {report['expired']} expired, {report['orphans']} orphaned containers, "
+                f"{report['stale_rows']} stale rows, {report['images']} images, {report['volumes']} volumes, "
+                f"{format_size(report['space_reclaimed'])} reclaimed in {report['duration']:.1f}s"
+            )
+            return report
+
+    async def _remove_expired(self, report: Dict):
+        now = datetime.datetime.now()
+        expired = [
+            record for records in db.by_user().values() for record in records
+            if record.get("expires_at") and datetime.datetime.fromisoformat(record["expires_at"]) <= now
+        ]
+        for record in expired:
+            container_id = record["container_id"]
+            api = docker_hosts.for_container(container_id)
+            try:
+                container = await api.get_container(container_id)
+                await api.remove(container, force=True)
+            except docker.errors.NotFound:
+                pass
+            except docker.errors.DockerException as e:
+                logger.error(f"Error removing expired instance {container_id[:12]}: {e}")
+                continue
+            tmate_sessions.discard(container_id)
+            remove_from_database(container_id)
+            report["expired"] += 1
             
-            if system_delta > 0 and cpu_delta > 0:
-                cpu_percent = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100
+            embed = discord.Embed(
+                title="⌛ Your Instance Said Goodbye",
+                description=f"`{container_id[:12]}` reached the end of its lifetime and was removed~ 🌸",
+                color=COLORS['purple']
+            )
+            embed.add_field(name="✨ Start Fresh", value="Use `/deploy` whenever you want a new one! 💖", inline=False)
+            try:
+                user = await bot.fetch_user(int(record["user_id"]))
+                await user.send(embed=embed)
+            except (discord.HTTPException, ValueError):
+                logger.warning(f"Could not send DM to user {record['user_id']}")
+
+    async def _remove_orphans(self, report: Dict):
+        listing = await docker_hosts.list_containers(all=True, sparse=True, filters=managed_filter())
+        for host_name, containers in listing.items():
+            for container in containers:
+                if db.get(container.id) or docker_hosts.is_tracked(container.id):
+                    continue
+                if container_age(container) < GC_ORPHAN_GRACE:
+                    continue
+                owner = container_owner(container)
+                if owner and container.id not in self.failed_deploys:
+                    # Someone's instance the store lost; only --rebuild-index may bring it back
+                    logger.warning(f"Container {container.id[:12]} of user {owner} on {host_name} is not in the store, keeping it")
+                    continue
+                try:
+                    await docker_hosts.get(host_name).api.remove(container, force=True)
+                except docker.errors.DockerException as e:
+                    logger.error(f"Error removing orphaned container {container.id[:12]} on {host_name}: {e}")
+                    continue
+                tmate_sessions.discard(container.id)
+                self.failed_deploys.discard(container.id)
+                logger.info(f"Removed orphaned container {container.id[:12]} on {host_name}")
+                report["orphans"] += 1
+
+    async def _prune(self, report: Dict):
+        for host in docker_hosts.hosts.values():
+            if not host.reachable:
+                continue
+            try:
+                images = await host.api.prune_images()
+                volumes = await host.api.prune_volumes()
+            except docker.errors.DockerException as e:
+                logger.error(f"Error pruning Docker host {host.name}: {e}")
+                continue
+            report["images"] += len(images.get("ImagesDeleted") or [])
+            report["volumes"] += len(volumes.get("VolumesDeleted") or [])
+            report["space_reclaimed"] += (images.get("SpaceReclaimed") or 0) + (volumes.get("SpaceReclaimed") or 0)
+
+garbage_collector = GarbageCollector()
+
+@tasks.loop(seconds=GC_INTERVAL)
+async def collect_garbage():
+    try:
+        await garbage_collector.run(prune=garbage_collector.prune_due())
+    except Exception as e:
+        logger.error(f"GC pass failed: {e}")
+
+# Config reload
+# Read once at startup; reloads keep the running value
+STARTUP_ONLY_CONFIG = ('TOKEN', 'BOT_INSTANCE_ID', 'METRICS_ADDRESS', 'METRICS_PORT')
+config_reload_lock = asyncio.Lock()
+config_reload_tasks: set = set()
+
+def refresh_config_state():
+    """Pushes freshly swapped constants into the objects that copied them at startup."""
+    global EMBEDS, IMAGE_SELECT_OPTIONS, TIER_SELECT_OPTIONS
+    docker_hosts.configure(DOCKER_HOSTS, DOCKER_TIMEOUTS)
+    reconciler.start()
+    deploy_scheduler.configure(DEPLOY_MAX_CONCURRENT, DEPLOY_MAX_PER_IMAGE)
+    warm_pool.resize(WARM_POOL_SIZES)
+    image_puller.configure(IMAGE_PULL_CONCURRENCY)
+    loop_profiler.threshold = PROFILER_STALL_THRESHOLD
+    image_puller.pull_all_soon()
+    EMBEDS = build_embeds()
+    IMAGE_SELECT_OPTIONS = build_image_select_options()
+    TIER_SELECT_OPTIONS = build_tier_select_options()
+    instance_choices.invalidate()
+
+async def reload_config(reason: str) -> bool:
+    """Re-reads CONFIG_FILE and swaps it in, or keeps the current config if it's invalid.
+
+    In-flight deployments keep the image data and limits they started with.
+    """
+    global config_loaded_fingerprint
+    async with config_reload_lock:
+        # Taken before reading, so a write that lands mid-load is picked up next poll
+        fingerprint = config_fingerprint(CONFIG_FILE)
+        try:
+            values = await asyncio.get_running_loop().run_in_executor(None, load_config, CONFIG_FILE)
+        except ConfigError as e:
+            logger.error(f"Config reload ({reason}) rejected, keeping the current config: {e}")
+            config_loaded_fingerprint = fingerprint
+            return False
+        except Exception:
+            # A validator bug must not take hot reload down with it
+            logger.exception(f"Config reload ({reason}) failed, keeping the current config")
+            config_loaded_fingerprint = fingerprint
+            return False
         
-        if 'memory_stats' in stats:
-            memory_usage = stats['memory_stats'].get('usage', 0)
-            memory_limit = stats['memory_stats'].get('limit', 1)
+        for name in STARTUP_ONLY_CONFIG:
+            if values[name] != globals()[name]:
+                logger.warning(f"{name} changed; it only takes effect after a restart")
+                values[name] = globals()[name]
         
-        return {
-            'cpu_percent': round(cpu_percent, 2),
-            'memory_usage': memory_usage,
-            'memory_limit': memory_limit,
-            'memory_percent': round((memory_usage / memory_limit) * 100, 2) if memory_limit else 0,
-            'online': container.status == 'running'
-        }
-    except Exception as e:
-        logger.error(f"Error getting stats for container {container_id}: {e}")
-        return None
+        changed = [name for name, value in values.items() if globals()[name] != value]
+        globals().update(values)
+        refresh_config_state()
+        # Only a changed setting overrides a start or stop from /admin-profile
+        if 'PROFILER_ENABLED' in changed:
+            if PROFILER_ENABLED:
+                loop_profiler.start(asyncio.get_running_loop())
+            else:
+                loop_profiler.stop()
+        config_loaded_fingerprint = fingerprint
+        logger.info(f"Config reloaded ({reason}): {', '.join(changed) or 'no changes'}")
+        return True
 
-async def capture_ssh_session_line(process) -> Optional[str]:
-    while True:
-        output = await process.stdout.readline()
-        if not output:
-            break
-        output = output.decode('utf-8').strip()
-        if "ssh session:" in output:
-            return output.split("ssh session:")[1].strip()
-    return None
+def request_config_reload(reason: str):
+    task = asyncio.create_task(reload_config(reason))
+    config_reload_tasks.add(task)
+    task.add_done_callback(config_reload_tasks.discard)
 
-async def execute_command(command: str) -> tuple:
-    process = await asyncio.create_subprocess_shell(
-        command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return stdout.decode(), stderr.decode()
+@tasks.loop(seconds=CONFIG_POLL_INTERVAL)
+async def watch_config():
+    try:
+        if config_fingerprint(CONFIG_FILE) != config_loaded_fingerprint:
+            await reload_config("file changed")
+    except Exception as e:
+        logger.error(f"Config watch failed: {e}")
 
 # Bot events
+index_checked = False  # on_ready runs again on every reconnect
+metrics_runner = None
+
+@tasks.loop(seconds=LOOP_LAG_PROBE_INTERVAL)
+async def probe_loop_lag():
+    # A yielded task goes to the back of the ready queue; how long it waits there is the lag
+    started = time.perf_counter()
+    await asyncio.sleep(0)
+    LOOP_LAG_SECONDS.observe(time.perf_counter() - started)
+
 @bot.event
 async def on_ready():
-    change_status.start()
+    global index_checked, metrics_runner
+    if hasattr(signal, 'SIGHUP'):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, request_config_reload, "SIGHUP")
+    if not watch_config.is_running():
+        watch_config.start()
+    if METRICS_PORT and metrics_runner is None:
+        try:
+            metrics_runner = await start_metrics_server()
+        except OSError as e:
+            logger.error(f"Could not serve metrics on {METRICS_ADDRESS}:{METRICS_PORT}: {e}")
+    if not probe_loop_lag.is_running():
+        probe_loop_lag.start()
+    if PROFILER_ENABLED:
+        loop_profiler.start(asyncio.get_running_loop())
+    if not refresh_docker_hosts.is_running():
+        refresh_docker_hosts.start()
+    if not prepull_images.is_running():
+        prepull_images.start()
+    # Before the warm pool and GC clean up, so they judge containers against the recovered store
+    if INDEX_STARTUP_MODE != "off" and not index_checked:
+        index_checked = True
+        try:
+            await recover_index(write=INDEX_STARTUP_MODE == "rebuild")
+        except Exception as e:
+            logger.error(f"Startup index check failed: {e}")
+    if not change_status.is_running():
+        change_status.start()
+    if not collect_stats.is_running():
+        collect_stats.start()
+    warm_pool.start()
+    reconciler.start(asyncio.get_running_loop())
+    if not reconcile_containers.is_running():
+        reconcile_containers.start()
+    if not hibernate_idle_instances.is_running():
+        hibernate_idle_instances.start()
+    if not collect_garbage.is_running():
+        collect_garbage.start()
     logger.info(f'NXH-i7 Bot is ready. Logged in as {bot.user}')
     await bot.tree.sync()
 
@@ -271,97 +3271,363 @@ async def change_status():
     except Exception as e:
         logger.error(f"Failed to update status: {e}")
 
+@tasks.loop(seconds=STATS_INTERVAL)
+async def collect_stats():
+    try:
+        await stats_cache.sweep()
+        idle_monitor.observe()
+    except Exception as e:
+        logger.error(f"Stats sweep failed: {e}")
+
+# Progress messages
+class ProgressMessage:
+    """Coalesced, background edits of one progress message.
+
+    ``update`` returns immediately: it snapshots the embed, and a single flusher
+    task edits the message at most once per interval with the newest snapshot.
+    States that were superseded in the meantime, or that match what's already
+    shown, are never sent, so Docker work never waits on Discord.
+    """
+
+    _flushing: set = set()  # Strong references so running flushers aren't garbage collected
+
+    def __init__(self, message, interval: float):
+        self.message = message
+        self.interval = interval
+        self._pending: Optional[Dict] = None
+        self._shown: Optional[Dict] = None
+        self._last_edit = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, embed: discord.Embed):
+        # to_dict() shares the field dicts that set_field_at() edits in place, so copy them
+        self._pending = copy.deepcopy(embed.to_dict())
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+            self._flushing.add(self._task)
+            self._task.add_done_callback(self._flushing.discard)
+
+    async def _flush(self):
+        while self._pending is not None:
+            delay = self._last_edit + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            snapshot, self._pending = self._pending, None
+            if snapshot == self._shown:
+                continue
+            try:
+                edit_started = time.perf_counter()
+                await self.message.edit(embed=discord.Embed.from_dict(snapshot))
+                DEPLOY_PHASE_SECONDS.observe(time.perf_counter() - edit_started, phase="discord_edit")
+                self._shown = snapshot
+            except discord.HTTPException as e:
+                logger.error(f"Error updating progress message: {e}")
+            self._last_edit = time.monotonic()
+
+# Deployment scheduling
+class DeployRejected(Exception):
+    pass
+
+class DeployJob:
+    def __init__(self, user_id: str, image_name: str, profile: Dict, warm: bool, run, on_position):
+        self.user_id = user_id
+        self.image_name = image_name
+        self.profile = profile
+        self.warm = warm  # Whether a warm pool instance can serve this job
+        self.host: Optional[str] = None  # Docker host picked when the job is admitted
+        self.run = run
+        self.on_position = on_position
+        self.position: Optional[int] = None
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+class DeployScheduler:
+    """Queues deployments and runs them under global and per-image concurrency limits.
+
+    Every user has their own FIFO queue and users are served round-robin, so a
+    burst from one user can't starve the others. A job is only started when the
+    Docker host has room for the job's resource profile (or a warm instance is
+    ready); otherwise it waits, and is rejected after DEPLOY_ADMISSION_TIMEOUT.
+    The chosen host's memory stays reserved until the job finishes.
+    """
+
+    def __init__(self, max_concurrent: int, max_per_image: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_image = max_per_image
+        self._queues: Dict[str, deque] = {}
+        self._running: Dict[str, int] = {}
+        self._running_per_user: Dict[str, int] = {}
+        self._held: Dict[str, int] = {}  # Deployments between the limit check and submit()
+        self._running_total = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._background: set = set()
+
+    def configure(self, max_concurrent: int, max_per_image: int):
+        # Lowered limits only hold back new jobs, running ones are left alone
+        self.max_concurrent = max_concurrent
+        self.max_per_image = max_per_image
+        self._wakeup.set()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def pending_for(self, user_id: str) -> int:
+        return len(self._queues.get(user_id, ())) + self._running_per_user.get(user_id, 0) + self._held.get(user_id, 0)
+
+    def hold(self, user_id: str):
+        """Counts a deployment that's about to be submitted against the user's limit."""
+        self._held[user_id] = self._held.get(user_id, 0) + 1
+
+    def release_hold(self, user_id: str):
+        self._held[user_id] -= 1
+        if not self._held[user_id]:
+            del self._held[user_id]
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def submit(self, job: DeployJob):
+        self._queues.setdefault(job.user_id, deque()).append(job)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        await job.future
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                self._dispatch()
+                self._publish_positions()
+            except Exception as e:
+                logger.error(f"Deploy scheduler error: {e}")
+            try:
+                # Re-check periodically so jobs deferred for memory get another chance
+                await asyncio.wait_for(self._wakeup.wait(), 5)
+            except asyncio.TimeoutError:
+                pass
+
+    def _admit(self, job: DeployJob) -> bool:
+        if job.warm and warm_pool.ready_count(job.image_name) > self._running.get(job.image_name, 0):
+            return True
+        job.host = docker_hosts.place(job.profile, DEPLOY_MEMORY_HEADROOM)
+        return job.host is not None
+
+    def _dispatch(self):
+        for user_id in list(self._queues):
+            if self._running_total >= self.max_concurrent:
+                return
+            queue = self._queues[user_id]
+            job = queue[0]
+            if self._running.get(job.image_name, 0) >= self.max_per_image:
+                continue
+            
+            if not self._admit(job):
+                if time.monotonic() - job.enqueued_at < DEPLOY_ADMISSION_TIMEOUT:
+                    continue
+                self._pop(user_id)
+                job.future.set_exception(DeployRejected("None of our hosts have room for another instance right now"))
+                continue
+            
+            self._pop(user_id)
+            job.position = 0
+            self._running_total += 1
+            if job.host:
+                # Running jobs haven't necessarily allocated their memory yet
+                docker_hosts.reserve(job.host, job.profile['memory'], starting=True)
+            self._running[job.image_name] = self._running.get(job.image_name, 0) + 1
+            self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+            self._spawn(self._execute(job))
+
+    def _pop(self, user_id: str):
+        queue = self._queues.pop(user_id)
+        queue.popleft()
+        if queue:
+            # Re-inserting moves the user to the back of the round-robin order
+            self._queues[user_id] = queue
+
+    async def _execute(self, job: DeployJob):
+        label_task(f"deploy {job.image_name}")
+        try:
+            await job.run()
+            job.future.set_result(None)
+        except Exception as e:
+            job.future.set_exception(e)
+        finally:
+            self._running_total -= 1
+            if job.host:
+                docker_hosts.release(job.host, job.profile['memory'], starting=True)
+            self._running[job.image_name] -= 1
+            self._running_per_user[job.user_id] -= 1
+            if not self._running_per_user[job.user_id]:
+                del self._running_per_user[job.user_id]
+            self._wakeup.set()
+
+    def _publish_positions(self):
+        # Position in the order jobs would be dispatched: round-robin across user queues
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        for depth in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[depth] for queue in queues if depth < len(queue))
+        for position, job in enumerate(order, start=1):
+            if job.position != position:
+                job.position = position
+                self._spawn(job.on_position(position))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+deploy_scheduler = DeployScheduler(DEPLOY_MAX_CONCURRENT, DEPLOY_MAX_PER_IMAGE)
+metrics.register(Gauge("nxh_deploy_queue_depth", "Deployments waiting for admission", (), lambda: {(): deploy_scheduler.queued}))
+metrics.register(Gauge("nxh_deploys_running", "Deployments admitted and running", (), lambda: {(): deploy_scheduler._running_total}))
+
 # Command functions
-async def create_server_task(interaction: discord.Interaction, image_name: str):
+async def create_server_task(interaction: discord.Interaction, image_name: str, profile_name: Optional[str] = None):
     user = str(interaction.user.id)
     
-    if count_user_containers(user) >= SERVER_LIMIT:
-        embed = discord.Embed(
-            title="🥺 Instance Limit Reached",
-            description=f"You can only have {SERVER_LIMIT} adorable instances at a time, sweetie! 💔",
-            color=COLORS['error']
-        )
-        embed.add_field(name="💡 Tip", value="Remove an existing instance to make room for a new one! 🌸", inline=False)
-        await interaction.followup.send(embed=embed)
+    image_data = DOCKER_IMAGES.get(image_name)
+    if not image_data or (profile_name and profile_name not in image_data['profiles']):
+        await interaction.followup.send(embed=EMBEDS['invalid_image'])
         return
+    default_profile = image_data['profiles'][0]
+    profile_name = profile_name or default_profile
+    profile = RESOURCE_PROFILES[profile_name]
     
-    image_data = DOCKER_IMAGES.get(image_name)
-    if not image_data:
-        embed = discord.Embed(
-            title="😿 Invalid Image",
-            description="The selected image isn't available right now, cutie!",
-            color=COLORS['error']
-        )
-        await interaction.followup.send(embed=embed)
+    # Deployments still in the queue count against the limit too
+    if count_user_containers(user) + deploy_scheduler.pending_for(user) >= SERVER_LIMIT:
+        await interaction.followup.send(embed=EMBEDS['instance_limit'])
         return
+    # Holds the slot across the await below, so a second click can't pass the check meanwhile
+    deploy_scheduler.hold(user)
     
-    # Send initial embed with loading animation
-    embed = discord.Embed(
-        title=f"✨ Creating Your {image_data['display_name']} Instance",
-        description="Your magical instance is being prepared with love~ 💖",
-        color=COLORS['info']
+    # Send initial embed with loading animation. Progress updates mutate it, and
+    # Embed.copy() costs more than building it, so this one is built per deploy
+    embed = _deploying_embed(image_data)
+    try:
+        message = await interaction.followup.send(embed=embed)
+    finally:
+        # The job is queued below with no await in between, so the slot stays taken
+        deploy_scheduler.release_hold(user)
+    progress = ProgressMessage(message, PROGRESS_FLUSH_INTERVAL)
+    
+    async def show_queue_position(position: int):
+        if job.position != position:
+            return  # Superseded, or the deployment already started
+        embed.set_field_at(0, name="🌟 Status", value=f"⏳ Waiting in line~ You're #{position} 💖", inline=False)
+        progress.update(embed)
+    
+    job = DeployJob(
+        user,
+        image_name,
+        profile,
+        profile_name == default_profile,
+        lambda: run_deployment(interaction, progress, embed, image_name, image_data, profile_name, profile, job.host),
+        show_queue_position
     )
-    embed.add_field(name="🌟 Status", value="🔄 Sprinkling magic dust...", inline=False)
-    message = await interaction.followup.send(embed=embed)
+    try:
+        await deploy_scheduler.submit(job)
+    except DeployRejected as e:
+        logger.warning(f"Deployment for user {user} rejected: {e}")
+        failure_embed = error_embed("😿 We're All Full Right Now", f"{e} 💔")
+        failure_embed.add_field(
+            name="🤗 Don't worry!",
+            value="Try again in a little while, sweetie! 💖",
+            inline=False
+        )
+        progress.update(failure_embed)
+
+async def run_deployment(interaction: discord.Interaction, progress: ProgressMessage, embed: discord.Embed, image_name: str, image_data: Dict, profile_name: str, profile: Dict, host_name: Optional[str]):
+    user = str(interaction.user.id)
+    deploy_started = time.perf_counter()
+    # Runs in a scheduler task, not the interaction's, so the context starts over
+    bind_log_context(interaction=interaction.id, user=user, command="deploy", image=image_name, phase="admitted")
     
     try:
-        # Step 1: Pull the image if not exists
-        embed.set_field_at(0, name="🌟 Status", value="🔍 Checking for magical components...", inline=False)
-        await message.edit(embed=embed)
-        
-        try:
-            client.images.get(image_data['name'])
-        except docker.errors.ImageNotFound:
-            embed.set_field_at(0, name="🌟 Status", value="⬇️ Downloading cute components...", inline=False)
-            await message.edit(embed=embed)
+        # Grab a pre-started instance if the warm pool has one ready (they run the default profile)
+        warm_instance = None
+        if profile_name == image_data['profiles'][0]:
+            warm_instance = warm_pool.take(image_name)
+            CACHE_REQUESTS.inc(cache="warm_pool", result="hit" if warm_instance else "miss")
+        if warm_instance:
+            container_id = warm_instance.container.id
+            session = warm_instance.session
+            host_name = warm_instance.host_name
+            update_log_context(container=container_id[:12], host=host_name, phase="warm")
+            # Labels can't change after creation, so the owner goes into the name
+            try:
+                await docker_hosts.get(host_name).api.rename(warm_instance.container, owned_name(user, container_id))
+            except docker.errors.DockerException as e:
+                logger.warning(f"Could not name warm instance {container_id[:12]} after its owner: {e}")
+        else:
+            # Admitted for a warm instance that someone else got first
+            host_name = host_name or docker_hosts.place(profile, DEPLOY_MEMORY_HEADROOM)
+            if not host_name:
+                raise Exception("None of our hosts have room for your instance right now")
+            api = docker_hosts.get(host_name).api
+            
+            # Step 1: Pull the image if not exists (or wait for the pre-pull that's already fetching it)
+            embed.set_field_at(0, name="🌟 Status", value="🔍 Checking for magical components...", inline=False)
+            progress.update(embed)
             
+            def show_pull(pull: ImagePull):
+                embed.set_field_at(0, name="🌟 Status", value=f"⬇️ Downloading cute components...{describe_pull(pull)}", inline=False)
+                progress.update(embed)
+        
+            update_log_context(host=host_name, phase="pull")
+            phase_started = time.perf_counter()
             try:
-                client.images.pull(image_data['name'])
+                await image_puller.ensure(image_data['name'], host_name, show_pull)
             except docker.errors.DockerException as e:
                 logger.error(f"Error pulling image {image_data['name']}: {e}")
                 raise Exception(f"Failed to download magical components: {e}")
+            DEPLOY_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="pull")
         
-        # Step 2: Create container
-        embed.set_field_at(0, name="🌟 Status", value="🛠️ Assembling your instance with care...", inline=False)
-        await message.edit(embed=embed)
+            # Step 2: Create container
+            embed.set_field_at(0, name="🌟 Status", value="🛠️ Assembling your instance with care...", inline=False)
+            progress.update(embed)
         
-        try:
-            container = client.containers.run(
-                image_data['name'],
-                detach=True,
-                tty=True,
-                mem_limit='6g',  # 6GB memory limit
-                cpu_quota=200000,  # Limit CPU usage
-                cpu_shares=512,  # CPU priority
-                restart_policy={"Name": "on-failure", "MaximumRetryCount": 3}
-            )
-            container_id = container.id
-        except docker.errors.DockerException as e:
-            logger.error(f"Error creating container: {e}")
-            raise Exception(f"Failed to create your adorable instance: {e}")
+            update_log_context(phase="run")
+            phase_started = time.perf_counter()
+            try:
+                container = await run_instance_container(image_data, profile, host_name, instance_labels(user, image_name, profile_name))
+                container_id = container.id
+            except docker.errors.DockerException as e:
+                logger.error(f"Error creating container: {e}")
+                raise Exception(f"Failed to create your adorable instance: {e}")
+            DEPLOY_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="run")
         
-        # Step 3: Start tmate session
-        embed.set_field_at(0, name="🌟 Status", value="🔑 Creating secure access magic...", inline=False)
-        await message.edit(embed=embed)
+            # Step 3: Start tmate session
+            embed.set_field_at(0, name="🌟 Status", value="🔑 Creating secure access magic...", inline=False)
+            progress.update(embed)
         
-        try:
-            exec_cmd = await asyncio.create_subprocess_exec(
-                "docker", "exec", container_id, "tmate", "-F",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            ssh_session_line = await capture_ssh_session_line(exec_cmd)
-            
-            if not ssh_session_line:
-                raise Exception("Failed to generate SSH session")
-        except Exception as e:
-            logger.error(f"Error generating SSH session: {e}")
-            container.stop()
-            container.remove()
-            raise Exception(f"Failed to create magical access: {e}")
+            update_log_context(container=container_id[:12], phase="tmate")
+            phase_started = time.perf_counter()
+            try:
+                session = await tmate_sessions.get(container_id)
+            except Exception as e:
+                logger.error(f"Error generating SSH session: {e}")
+                tmate_sessions.discard(container_id)
+                try:
+                    await api.remove(container, force=True)
+                except docker.errors.DockerException as cleanup_error:
+                    # It has an owner label, so the GC only removes it as an orphan once told it's a failed deploy
+                    logger.error(f"Error removing failed instance {container_id[:12]}: {cleanup_error}")
+                    garbage_collector.failed_deploys.add(container_id)
+                docker_hosts.forget(container_id)
+                raise Exception(f"Failed to create magical access: {e}")
+            DEPLOY_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="tmate")
         
         # Step 4: Finalize
-        add_to_database(user, container_id, ssh_session_line, image_name)
+        ssh_session_line = session.ssh
+        update_log_context(phase="db_write")
+        phase_started = time.perf_counter()
+        add_to_database(user, container_id, ssh_session_line, image_name, profile_name, host_name)
+        DEPLOY_PHASE_SECONDS.observe(time.perf_counter() - phase_started, phase="db_write")
+        DEPLOY_SECONDS.observe(time.perf_counter() - deploy_started, source="warm" if warm_instance else "cold")
         
         # Create success embed
         success_embed = discord.Embed(
@@ -374,9 +3640,10 @@ async def create_server_task(interaction: discord.Interaction, image_name: str):
             value=f"```{ssh_session_line}```",
             inline=False
         )
+        add_tmate_link_fields(success_embed, session)
         success_embed.add_field(
             name="🎀 Resources",
-            value=f"{image_data['ram']} RAM | {image_data['cpu']} CPU",
+            value=describe_profile(profile),
             inline=True
         )
         success_embed.add_field(
@@ -406,53 +3673,35 @@ async def create_server_task(interaction: discord.Interaction, image_name: str):
             value="Check your DMs for SSH access details! 💖",
             inline=False
         )
-        await message.edit(embed=embed)
+        progress.update(embed)
         
     except Exception as e:
         logger.error(f"Error in deployment: {e}")
         
-        error_embed = discord.Embed(
-            title="😿 Deployment Failed",
-            description=f"Something went wrong: {str(e)}",
-            color=COLORS['error']
-        )
-        error_embed.add_field(
+        failure_embed = error_embed("😿 Deployment Failed", f"Something went wrong: {str(e)}")
+        failure_embed.add_field(
             name="💔 Status",
             value="Failed - Please try again later, sweetie",
             inline=False
         )
-        error_embed.add_field(
+        failure_embed.add_field(
             name="🤗 Don't worry!",
             value="These things happen sometimes. Try again in a moment! 💖",
             inline=False
         )
         
-        await message.edit(embed=error_embed)
+        progress.update(failure_embed)
 
 async def manage_server(interaction: discord.Interaction, action: str, container_id: str):
-    user = str(interaction.user.id)
+    # container_id has already been expanded and authorized by the middleware
     container_info = get_container_info(container_id)
     
-    if not container_info:
-        embed = discord.Embed(
-            title="🔍 Instance Not Found",
-            description="No adorable instance found with that ID, sweetie! 🥺",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
-    if container_info['user_id'] != user and interaction.user.id not in ADMIN_IDS:
-        embed = discord.Embed(
-            title="🚫 Permission Denied",
-            description="You don't have permission to manage this cute instance! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
+    # Docker calls below can take longer than the 3 second interaction window
+    await interaction.response.defer()
     
     try:
-        container = client.containers.get(container_id)
+        api = docker_hosts.for_container(container_id)
+        container = await api.get_container(container_id)
         image_data = DOCKER_IMAGES.get(container_info['image'], {})
         
         action_emojis = {
@@ -469,21 +3718,27 @@ async def manage_server(interaction: discord.Interaction, action: str, container
             "remove": "removed with care"
         }
         
+        resuming = action == "start" and bool(container_info.get('hibernated_at'))
         if action == "start":
-            container.start()
+            resume_started = time.perf_counter()
+            await api.start(container)
             status = "started"
             update_container_status(container_id, "running")
+            update_container_hibernation(container_id, None)
         elif action == "stop":
-            container.stop()
+            await api.stop(container)
+            tmate_sessions.discard(container_id)
             status = "stopped"
             update_container_status(container_id, "stopped")
         elif action == "restart":
-            container.restart()
+            await api.restart(container)
+            tmate_sessions.discard(container_id)
             status = "restarted"
             update_container_status(container_id, "running")
         elif action == "remove":
-            container.stop()
-            container.remove()
+            await api.stop(container)
+            await api.remove(container)
+            tmate_sessions.discard(container_id)
             remove_from_database(container_id)
             status = "removed"
         else:
@@ -496,7 +3751,7 @@ async def manage_server(interaction: discord.Interaction, action: str, container
         )
         
         if action != "remove":
-            stats = await get_container_stats(container_id)
+            stats = get_container_stats(container_id)
             if stats:
                 embed.add_field(
                     name="📊 Current Stats",
@@ -510,95 +3765,60 @@ async def manage_server(interaction: discord.Interaction, action: str, container
                 inline=False
             )
         
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
         
         if action in ["start", "restart"]:
-            # Regenerate SSH session after restart
+            # Reuses the running tmate session, or starts one after a restart
             try:
-                exec_cmd = await asyncio.create_subprocess_exec(
-                    "docker", "exec", container_id, "tmate", "-F",
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                ssh_session_line = await capture_ssh_session_line(exec_cmd)
+                session = await tmate_sessions.get(container_id)
+                update_container_ssh(container_id, session.ssh)
                 
-                if ssh_session_line:
-                    dm_embed = discord.Embed(
-                        title=f"🔑 Fresh SSH Access for {image_data.get('display_name', 'Your Instance')}",
-                        description=f"Here's your new magical access key! 💖\n```{ssh_session_line}```",
-                        color=COLORS['info']
-                    )
+                dm_embed = discord.Embed(
+                    title=f"🔑 Fresh SSH Access for {image_data.get('display_name', 'Your Instance')}",
+                    description=f"Here's your new magical access key! 💖\n```{session.ssh}```",
+                    color=COLORS['info']
+                )
+                dm_embed.add_field(
+                    name="🆔 Instance ID",
+                    value=container_id[:12],
+                    inline=False
+                )
+                add_tmate_link_fields(dm_embed, session)
+                if resuming:
+                    resume_seconds = time.perf_counter() - resume_started
+                    logger.info(f"Resumed hibernated instance {container_id[:12]}: SSH ready {resume_seconds * 1000:.0f}ms after start")
                     dm_embed.add_field(
-                        name="🆔 Instance ID",
-                        value=container_id[:12],
+                        name="⏰ Woke Up In",
+                        value=f"{resume_seconds:.1f}s",
                         inline=False
                     )
-                    await interaction.user.send(embed=dm_embed)
+                await interaction.user.send(embed=dm_embed)
             except Exception as e:
                 logger.error(f"Error regenerating SSH session: {e}")
     
     except docker.errors.NotFound:
-        embed = discord.Embed(
-            title="😿 Instance Not Found",
-            description="The container no longer exists, sweetie!",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=EMBEDS['gone'])
         remove_from_database(container_id)
     except docker.errors.DockerException as e:
-        embed = discord.Embed(
-            title="💔 Error Managing Instance",
-            description=f"Something went wrong: {str(e)}",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed)
+        embed = error_embed("💔 Error Managing Instance", f"Something went wrong: {str(e)}")
+        await interaction.followup.send(embed=embed)
 
 async def regen_ssh_command(interaction: discord.Interaction, container_id: str):
-    user = str(interaction.user.id)
     container_info = get_container_info(container_id)
     
-    if not container_info:
-        embed = discord.Embed(
-            title="🔍 Instance Not Found",
-            description="No adorable instance found with that ID, sweetie! 🥺",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
-    if container_info['user_id'] != user and interaction.user.id not in ADMIN_IDS:
-        embed = discord.Embed(
-            title="🚫 Permission Denied",
-            description="You don't have permission to manage this cute instance! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
     await interaction.response.defer()
     
     try:
-        container = client.containers.get(container_id)
+        container = await docker_hosts.for_container(container_id).get_container(container_id)
         if container.status != 'running':
             raise Exception("Instance is not running right now")
         
-        exec_cmd = await asyncio.create_subprocess_exec(
-            "docker", "exec", container_id, "tmate", "-F",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        ssh_session_line = await capture_ssh_session_line(exec_cmd)
-        
-        if not ssh_session_line:
-            raise Exception("Failed to generate SSH session")
+        # Replaces the container's tmate session, so the old credentials stop working
+        session = await tmate_sessions.get(container_id, fresh=True)
+        ssh_session_line = session.ssh
         
         # Update the database with new SSH command
-        data = load_database()
-        for user_id, containers in data.items():
-            for container in containers:
-                if container["container_id"] == container_id:
-                    container["ssh_command"] = ssh_session_line
-        save_database(data)
+        update_container_ssh(container_id, ssh_session_line)
         
         image_data = DOCKER_IMAGES.get(container_info['image'], {})
         
@@ -612,6 +3832,7 @@ async def regen_ssh_command(interaction: discord.Interaction, container_id: str)
             value=container_id[:12],
             inline=False
         )
+        add_tmate_link_fields(embed, session)
         embed.add_field(
             name="💡 Keep it Safe!",
             value="Save this somewhere secure, cutie! 💖",
@@ -628,11 +3849,7 @@ async def regen_ssh_command(interaction: discord.Interaction, container_id: str)
         )
     
     except Exception as e:
-        embed = discord.Embed(
-            title="😿 Error Generating SSH",
-            description=f"Something went wrong: {str(e)}",
-            color=COLORS['error']
-        )
+        embed = error_embed("😿 Error Generating SSH", f"Something went wrong: {str(e)}")
         embed.add_field(
             name="💭 Suggestion",
             value="Make sure your instance is running first! 🌸",
@@ -643,31 +3860,12 @@ async def regen_ssh_command(interaction: discord.Interaction, container_id: str)
 async def show_instance_info(interaction: discord.Interaction, container_id: str):
     container_info = get_container_info(container_id)
     
-    if not container_info:
-        embed = discord.Embed(
-            title="🔍 Instance Not Found",
-            description="No adorable instance found with that ID, sweetie! 🥺",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
-    user = str(interaction.user.id)
-    if container_info['user_id'] != user and interaction.user.id not in ADMIN_IDS:
-        embed = discord.Embed(
-            title="🚫 Permission Denied",
-            description="You don't have permission to view this cute instance! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
     await interaction.response.defer()
     
     try:
-        container = client.containers.get(container_id)
+        container = await docker_hosts.for_container(container_id).get_container(container_id)
         image_data = DOCKER_IMAGES.get(container_info['image'], {})
-        stats = await get_container_stats(container_id)
+        stats = get_container_stats(container_id)
         
         status_emojis = {
             'running': '💚',
@@ -695,6 +3893,14 @@ async def show_instance_info(interaction: discord.Interaction, container_id: str
             value=datetime.datetime.fromisoformat(container_info['created_at']).strftime('%Y-%m-%d %H:%M'),
             inline=True
         )
+        if len(docker_hosts.hosts) > 1:
+            embed.add_field(name="🏠 Host", value=docker_hosts.host_of(container_id), inline=True)
+        if container_info.get('expires_at'):
+            embed.add_field(
+                name="⌛ Lives Until",
+                value=datetime.datetime.fromisoformat(container_info['expires_at']).strftime('%Y-%m-%d %H:%M'),
+                inline=True
+            )
         
         if stats:
             embed.add_field(
@@ -720,190 +3926,125 @@ async def show_instance_info(interaction: discord.Interaction, container_id: str
                 inline=False
             )
         
-        view = View()
-        if container.status == 'running':
-            stop_button = Button(label="Take a Nap", style=discord.ButtonStyle.secondary, emoji="💤")
-            stop_button.callback = lambda i: manage_server(i, "stop", container_id)
-            view.add_item(stop_button)
-            
-            restart_button = Button(label="Fresh Start", style=discord.ButtonStyle.primary, emoji="🔄")
-            restart_button.callback = lambda i: manage_server(i, "restart", container_id)
-            view.add_item(restart_button)
-        else:
-            start_button = Button(label="Wake Up!", style=discord.ButtonStyle.success, emoji="💚")
-            start_button.callback = lambda i: manage_server(i, "start", container_id)
-            view.add_item(start_button)
-        
-        ssh_button = Button(label="New SSH Magic", style=discord.ButtonStyle.secondary, emoji="🔑")
-        ssh_button.callback = lambda i: regen_ssh_command(i, container_id)
-        view.add_item(ssh_button)
-        
-        remove_button = Button(label="Say Goodbye", style=discord.ButtonStyle.danger, emoji="💔")
-        remove_button.callback = lambda i: manage_server(i, "remove", container_id)
-        view.add_item(remove_button)
+        actions = ["stop", "restart"] if container.status == 'running' else ["start"]
+        actions += ["regen", "remove"]
+        view = View(timeout=None)
+        for action in actions:
+            view.add_item(InstanceActionButton(action, container_id))
         
         await interaction.followup.send(embed=embed, view=view)
     
     except docker.errors.NotFound:
-        embed = discord.Embed(
-            title="😿 Instance Not Found",
-            description="The container no longer exists, sweetie!",
-            color=COLORS['error']
-        )
-        await interaction.followup.send(embed=embed)
+        await interaction.followup.send(embed=EMBEDS['gone'])
         remove_from_database(container_id)
     except Exception as e:
-        embed = discord.Embed(
-            title="💔 Error Getting Info",
-            description=f"Something went wrong: {str(e)}",
-            color=COLORS['error']
-        )
+        embed = error_embed("💔 Error Getting Info", f"Something went wrong: {str(e)}")
         await interaction.followup.send(embed=embed)
 
+# Persistent instance buttons
+# Buttons carry their action and container ID in the custom_id, so no per-message
+# state is kept and they keep working after a restart.
+async def route_instance_action(interaction: discord.Interaction, action: str, container_id: str):
+    # Component interactions don't go through the command tree, so check here
+    label_task(f"{action} button")
+    bind_log_context(interaction=interaction.id, user=str(interaction.user.id), command=f"{action} button", container=container_id[:12])
+    if not in_allowed_place(interaction):
+        await interaction.response.send_message(embed=EMBEDS['wrong_channel'], ephemeral=True)
+        return
+    container_id = await authorize_instance(interaction, container_id)
+    if not container_id:
+        return
+    
+    if action == "regen":
+        await regen_ssh_command(interaction, container_id)
+    else:
+        await manage_server(interaction, action, container_id)
+
+class InstanceActionButton(
+    discord.ui.DynamicItem[Button],
+    template=r"nxh:(?P<action>start|stop|restart|regen|remove):(?P<container_id>[0-9a-f]{12,64})"
+):
+    STYLES = {
+        "stop": ("Take a Nap", discord.ButtonStyle.secondary, "💤"),
+        "restart": ("Fresh Start", discord.ButtonStyle.primary, "🔄"),
+        "start": ("Wake Up!", discord.ButtonStyle.success, "💚"),
+        "regen": ("New SSH Magic", discord.ButtonStyle.secondary, "🔑"),
+        "remove": ("Say Goodbye", discord.ButtonStyle.danger, "💔"),
+    }
+
+    def __init__(self, action: str, container_id: str):
+        label, style, emoji = self.STYLES[action]
+        super().__init__(Button(label=label, style=style, emoji=emoji, custom_id=f"nxh:{action}:{container_id}"))
+        self.action = action
+        self.container_id = container_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        return cls(match["action"], match["container_id"])
+
+    async def callback(self, interaction: discord.Interaction):
+        await route_instance_action(interaction, self.action, self.container_id)
+
+bot.add_dynamic_items(InstanceActionButton)
+
 # Slash commands with channel restriction
 @bot.tree.command(name="deploy", description="Create a new adorable instance! 💖")
 async def deploy(interaction: discord.Interaction):
     """Show the image selection GUI for deployment"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-        
     view = ImageSelectView(interaction.user.id)
     
-    embed = discord.Embed(
-        title="✨ Welcome to NXH-i7! ✨",
-        description="Let's create something magical together~ Choose your perfect OS image! 💖",
-        color=COLORS['pink']
-    )
-    embed.add_field(
-        name="🌸 What's NXH-i7?",
-        value="Your cute cloud companion for creating adorable instances! 🐱",
-        inline=False
-    )
-    embed.add_field(
-        name="⏰ Time Limit",
-        value="You have 60 seconds to choose, cutie!",
-        inline=False
-    )
-    
-    await interaction.response.send_message(embed=embed, view=view)
+    await interaction.response.send_message(embed=EMBEDS['deploy_welcome'], view=view)
 
 @bot.tree.command(name="start", description="Wake up your sleeping instance! 💚")
 @app_commands.describe(container_id="The ID of your adorable instance (first 12 chars)")
+@app_commands.autocomplete(container_id=container_id_autocomplete)
 async def start(interaction: discord.Interaction, container_id: str):
     """Start a stopped instance"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    await manage_server(interaction, "start", container_id)
+    await manage_server(interaction, "start", interaction.extras['container_id'])
 
 @bot.tree.command(name="stop", description="Put your instance to sleep~ 💤")
 @app_commands.describe(container_id="The ID of your instance (first 12 chars)")
+@app_commands.autocomplete(container_id=container_id_autocomplete)
 async def stop(interaction: discord.Interaction, container_id: str):
     """Stop a running instance"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    await manage_server(interaction, "stop", container_id)
+    await manage_server(interaction, "stop", interaction.extras['container_id'])
 
 @bot.tree.command(name="restart", description="Give your instance a fresh start! 🔄")
 @app_commands.describe(container_id="The ID of your instance (first 12 chars)")
+@app_commands.autocomplete(container_id=container_id_autocomplete)
 async def restart(interaction: discord.Interaction, container_id: str):
     """Restart an instance"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    await manage_server(interaction, "restart", container_id)
+    await manage_server(interaction, "restart", interaction.extras['container_id'])
 
 @bot.tree.command(name="remove", description="Say goodbye to your instance 💔")
 @app_commands.describe(container_id="The ID of your instance (first 12 chars)")
+@app_commands.autocomplete(container_id=container_id_autocomplete)
 async def remove(interaction: discord.Interaction, container_id: str):
     """Remove an instance"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    await manage_server(interaction, "remove", container_id)
+    await manage_server(interaction, "remove", interaction.extras['container_id'])
 
 @bot.tree.command(name="regen-ssh", description="Create fresh SSH magic! 🔑✨")
 @app_commands.describe(container_id="The ID of your instance (first 12 chars)")
+@app_commands.autocomplete(container_id=container_id_autocomplete)
 async def regen_ssh(interaction: discord.Interaction, container_id: str):
     """Regenerate SSH session credentials"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    await regen_ssh_command(interaction, container_id)
+    await regen_ssh_command(interaction, interaction.extras['container_id'])
 
-@bot.tree.command(name="info", description="Get details about your cute instance! 💖")
+@bot.tree.command(name="info", description="Get details about your cute instance! 💖", extras={'view_only': True})
 @app_commands.describe(container_id="The ID of your instance (first 12 chars)")
+@app_commands.autocomplete(container_id=container_id_autocomplete)
 async def info(interaction: discord.Interaction, container_id: str):
     """Get detailed information about an instance"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    await show_instance_info(interaction, container_id)
+    await show_instance_info(interaction, interaction.extras['container_id'])
 
 @bot.tree.command(name="list", description="See all your adorable instances! 🌸")
 async def list_instances(interaction: discord.Interaction):
     """List all instances owned by the user"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-        
     user = str(interaction.user.id)
     containers = get_user_containers(user)
     
     if not containers:
-        embed = discord.Embed(
-            title="🥺 No Instances Found",
-            description="You don't have any cute instances yet! Use `/deploy` to create your first one~ 💖",
-            color=COLORS['yellow']
-        )
-        embed.add_field(
-            name="✨ Getting Started",
-            value="Type `/deploy` to begin your magical journey! 🌟",
-            inline=False
-        )
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=EMBEDS['no_instances'])
         return
     
     embed = discord.Embed(
@@ -915,13 +4056,16 @@ async def list_instances(interaction: discord.Interaction):
     status_emojis = {
         'running': '💚',
         'stopped': '💤',
-        'paused': '⏸️'
+        'paused': '⏸️',
+        'restarting': '🔄'
     }
     
     for container in containers:
         image_data = DOCKER_IMAGES.get(container['image'], {})
         status = container.get('status', 'unknown')
         status_emoji = status_emojis.get(status, '❓')
+        if status == 'stopped' and container.get('hibernated_at'):
+            status = 'hibernating'
         
         embed.add_field(
             name=f"✨ {image_data.get('display_name', 'Cute Instance')}",
@@ -940,15 +4084,6 @@ async def list_instances(interaction: discord.Interaction):
 @bot.tree.command(name="stats", description="See cute system statistics! 📊✨")
 async def stats(interaction: discord.Interaction):
     """Show system resource usage"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-        
     await interaction.response.defer()
     
     try:
@@ -958,8 +4093,14 @@ async def stats(interaction: discord.Interaction):
         disk = psutil.disk_usage('/')
         
         # Get Docker stats
-        total_containers = len(client.containers.list(all=True))
-        running_containers = len(client.containers.list())
+        total_containers = stats_cache.total_containers
+        running_containers = stats_cache.running_containers
+        if total_containers is None:
+            # No sweep has finished yet
+            listing = await docker_hosts.list_containers(all=True, sparse=True)
+            all_containers = [c for containers in listing.values() for c in containers]
+            total_containers = len(all_containers)
+            running_containers = len([c for c in all_containers if c.status == 'running'])
         
         embed = discord.Embed(
             title="📊 NXH-i7 System Statistics",
@@ -1000,115 +4141,20 @@ async def stats(interaction: discord.Interaction):
         await interaction.followup.send(embed=embed)
     
     except Exception as e:
-        embed = discord.Embed(
-            title="😿 Error Getting Statistics",
-            description=f"Something went wrong: {str(e)}",
-            color=COLORS['error']
-        )
+        embed = error_embed("😿 Error Getting Statistics", f"Something went wrong: {str(e)}")
         await interaction.followup.send(embed=embed)
 
 @bot.tree.command(name="help", description="Get help with NXH-i7! 🌸💡")
 async def help_command(interaction: discord.Interaction):
     """Show help message"""
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-        
-    embed = discord.Embed(
-        title="💖 NXH-i7 Help Center 💖",
-        description="Your guide to managing adorable cloud instances~ Let me show you all the magical commands! ✨",
-        color=COLORS['pink']
-    )
-    
-    embed.add_field(
-        name="🚀 `/deploy`",
-        value="Create a new adorable instance with our cute interface! 💖",
-        inline=False
-    )
-    embed.add_field(
-        name="📋 `/list`",
-        value="See all your precious instances in one place~ 🌸",
-        inline=False
-    )
-    embed.add_field(
-        name="ℹ️ `/info <id>`",
-        value="Get detailed info about any of your cute instances! 💡",
-        inline=False
-    )
-    embed.add_field(
-        name="💚 `/start <id>`",
-        value="Wake up a sleeping instance~ Rise and shine! ☀️",
-        inline=False
-    )
-    embed.add_field(
-        name="💤 `/stop <id>`",
-        value="Put an instance to sleep peacefully~ Sweet dreams! 🌙",
-        inline=False
-    )
-    embed.add_field(
-        name="🔄 `/restart <id>`",
-        value="Give your instance a fresh start with new energy! ✨",
-        inline=False
-    )
-    embed.add_field(
-        name="🔑 `/regen-ssh <id>`",
-        value="Create brand new SSH access magic~ Keep it secret! 🤫",
-        inline=False
-    )
-    embed.add_field(
-        name="💔 `/remove <id>`",
-        value="Say goodbye to an instance (this is permanent!) 😢",
-        inline=False
-    )
-    embed.add_field(
-        name="📊 `/stats`",
-        value="Check how our magical system is performing~ 💖",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="💡 Tips & Tricks",
-        value="• Keep your SSH commands safe! 🔐\n• You can have up to 3 instances~ 🌸\n• DMs contain important info! 💌\n• Use short IDs (first 12 characters) 📝",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="🆘 Need More Help?",
-        value="If something's not working, try again in a moment~ Our magic sometimes needs a second! ✨",
-        inline=False
-    )
-    
-    await interaction.response.send_message(embed=embed)
+    await interaction.response.send_message(embed=EMBEDS['help'])
 
 # Admin commands
-@bot.tree.command(name="admin-list", description="[ADMIN] View all instances in the system 👑")
+@bot.tree.command(name="admin-list", description="[ADMIN] View all instances in the system 👑", extras={'admin_only': True})
 async def admin_list(interaction: discord.Interaction):
     """Admin command to list all instances"""
-    if interaction.user.id not in ADMIN_IDS:
-        embed = discord.Embed(
-            title="🚫 Access Denied",
-            description="This command is for admins only, cutie! 💖",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
-    if not check_allowed_channel(interaction):
-        embed = discord.Embed(
-            title="🚫 Wrong Channel, sweetie!",
-            description="This command can only be used in the designated NXH-i7 channel! 💔",
-            color=COLORS['error']
-        )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        return
-    
-    data = load_database()
-    total_instances = sum(len(containers) for containers in data.values())
+    data = db.by_user()
+    total_instances = len(db)
     
     embed = discord.Embed(
         title="👑 Admin Panel - All Instances",
@@ -1141,4 +4187,91 @@ async def admin_list(interaction: discord.Interaction):
     
     await interaction.response.send_message(embed=embed)
 
-bot.run(TOKEN)
\ No newline at end of file
+@bot.tree.command(name="admin-gc", description="[ADMIN] Clean up leftovers right now 🧹", extras={'admin_only': True})
+@app_commands.describe(prune="Also prune dangling images and volumes (slow!)")
+async def admin_gc(interaction: discord.Interaction, prune: bool = False):
+    """Admin command to run a garbage collection pass"""
+    await interaction.response.defer()
+    
+    try:
+        report = await garbage_collector.run(prune=prune)
+    except Exception as e:
+        embed = error_embed("😿 Cleanup Failed", f"Something went wrong: {str(e)}")
+        await interaction.followup.send(embed=embed)
+        return
+    
+    embed = discord.Embed(
+        title="🧹 Sparkly Clean!",
+        description=f"Tidied everything up in {report['duration']:.1f}s~ 💖",
+        color=COLORS['success']
+    )
+    embed.add_field(name="⌛ Expired Instances", value=str(report['expired']), inline=True)
+    embed.add_field(name="👻 Orphaned Containers", value=str(report['orphans']), inline=True)
+    embed.add_field(name="📝 Stale Records", value=str(report['stale_rows']), inline=True)
+    if prune:
+        embed.add_field(name="🖼️ Images Pruned", value=str(report['images']), inline=True)
+        embed.add_field(name="📦 Volumes Pruned", value=str(report['volumes']), inline=True)
+        embed.add_field(name="💾 Space Reclaimed", value=format_size(report['space_reclaimed']), inline=True)
+    
+    await interaction.followup.send(embed=embed)
+
+@bot.tree.command(name="admin-profile", description="[ADMIN] See what's been blocking the bot 🐢", extras={'admin_only': True})
+@app_commands.describe(action="Show the report, or start, stop or reset the profiler")
+async def admin_profile(interaction: discord.Interaction, action: Literal["show", "start", "stop", "reset"] = "show"):
+    """Admin command to control the event loop profiler and show what it caught"""
+    if action == "start":
+        loop_profiler.start(asyncio.get_running_loop())
+    elif action == "stop":
+        loop_profiler.stop()
+    elif action == "reset":
+        loop_profiler.reset()
+    
+    stalls, totals = loop_profiler.snapshot()
+    if loop_profiler.running:
+        status = f"Watching since <t:{int(loop_profiler.started_at)}:R> for stalls over {loop_profiler.threshold * 1000:.0f}ms"
+    else:
+        status = "Not running; use `/admin-profile start` or set `profiler.enabled`"
+    embed = discord.Embed(
+        title="🐢 Event Loop Profile",
+        description=f"{status}~ 💖",
+        color=COLORS['blue'] if loop_profiler.running else COLORS['yellow']
+    )
+    embed.add_field(name="⏱️ Worst Lag", value=f"{loop_profiler.max_lag * 1000:.0f}ms", inline=True)
+    embed.add_field(name="🧊 Stalls", value=str(sum(count for count, _, _ in totals.values())), inline=True)
+    
+    offenders = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:5]
+    if offenders:
+        embed.add_field(
+            name="🔍 Biggest Blockers",
+            value="\n".join(
+                f"`{command}` at `{site}` → `{call}`: {count}× {seconds:.2f}s (worst {worst * 1000:.0f}ms)"
+                for (command, site, call), (count, seconds, worst) in offenders
+            )[:1024],
+            inline=False
+        )
+    if stalls:
+        embed.add_field(
+            name="🕐 Latest Stalls",
+            value="\n".join(
+                f"<t:{int(stall['started_at'])}:T> {stall['duration'] * 1000:.0f}ms `{stall['command']}` at `{stall['site']}` → `{stall['call']}`"
+                for stall in reversed(stalls[-5:])
+            )[:1024],
+            inline=False
+        )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+if __name__ == '__main__':
+    if '--bench-embeds' in sys.argv:
+        benchmark_embeds()
+    elif '--bench-images' in sys.argv:
+        # --bench-images [RUNS] IMAGE...; defaults to the configured images
+        args = sys.argv[sys.argv.index('--bench-images') + 1:]
+        runs = int(args.pop(0)) if args and args[0].isdigit() else 3
+        asyncio.run(benchmark_images(args or [image_data['name'] for image_data in DOCKER_IMAGES.values()], runs))
+    elif '--verify-index' in sys.argv or '--rebuild-index' in sys.argv:
+        report = asyncio.run(recover_index(write='--rebuild-index' in sys.argv))
+        print(json.dumps(report, indent=2))
+    else:
+        # Logging is already set up; discord.py's records go through the same queue
+        bot.run(TOKEN, log_handler=None)